@@ -1,8 +1,10 @@
 import streamlit as st
 import pandas as pd
-import requests
+import numpy as np
 import io
 
+from batch_client import BatchClient, ChunkError
+
 # Cấu hình trang
 st.set_page_config(page_title="Hệ thống Phân loại Hạt Bí", layout="wide", page_icon="🎃")
 
@@ -19,6 +21,12 @@ REQUIRED_COLUMNS = [
     "Extent", "Roundness", "Aspect_Ration", "Compactness"
 ]
 
+# Endpoint theo cột của FastAPI, số hàng mỗi chunk và số chunk gửi song song
+API_URL = "http://127.0.0.1:8000/predict_batch_columnar"
+CHUNK_ROWS = 5000
+MAX_WORKERS = 4
+PREVIEW_ROWS = 1000
+
 # 2. Thành phần Upload file (Hỗ trợ CSV và XLSX)
 uploaded_file = st.file_uploader("Tải file dữ liệu của bạn (CSV hoặc Excel)", type=["csv", "xlsx"])
 
@@ -45,46 +53,59 @@ if uploaded_file is not None:
             st.info("✅ File có đầy đủ các cột cần thiết. Sẵn sàng dự đoán.")
             
             if st.button("🚀 Tiến hành Dự đoán Hàng loạt"):
-                # Chuẩn bị dữ liệu để gửi lên API (chỉ lấy 12 cột yêu cầu)
-                data_to_send = df[REQUIRED_COLUMNS].to_dict(orient="records")
-                
-                with st.spinner('Đang kết nối với Server để xử lý...'):
-                    try:
-                        # Gửi request POST đến FastAPI
-                        # Lưu ý: Địa chỉ này phải khớp với địa chỉ uvicorn đang chạy
-                        API_URL = "http://127.0.0.1:8000/predict_batch"
-                        response = requests.post(API_URL, json=data_to_send, timeout=30)
-                        
-                        if response.status_code == 200:
-                            results = response.json()
-                            
-                            # 4. Gộp kết quả dự đoán vào DataFrame hiện tại
-                            df['Dự đoán'] = results['predictions']
-                            df['Độ tin cậy'] = results['probabilities']
-                            
-                            st.divider()
-                            st.subheader("📊 Kết quả dự đoán:")
-                            
-                            # Hiển thị bảng kết quả với màu sắc (tùy chọn)
-                            st.dataframe(df)
+                # Gửi file theo từng chunk song song (định dạng nhị phân theo cột), hiển thị kết quả dần dần.
+                # Chunk lỗi được gửi lại riêng, không phải gửi lại cả file.
+                # Lưu ý: Địa chỉ này phải khớp với địa chỉ uvicorn đang chạy
+                n_rows = len(df)
+                predictions = np.full(n_rows, None, dtype=object)
+                confidences = np.full(n_rows, None, dtype=object)
+                done = np.zeros(n_rows, dtype=bool)
+                invalid = np.zeros(n_rows, dtype=bool)
+
+                st.divider()
+                st.subheader("📊 Kết quả dự đoán:")
+                progress = st.progress(0.0, text="Đang gửi dữ liệu lên Server...")
+                table = st.empty()
+                try:
+                    with BatchClient(API_URL, REQUIRED_COLUMNS, CHUNK_ROWS, MAX_WORKERS) as client:
+                        for result in client.predict(df):
+                            rows = slice(result.start, result.stop)
+                            predictions[rows] = result.predictions
+                            # Hàng server đánh dấu không hợp lệ (thiếu giá trị / ngoài miền) không có dự đoán
+                            confidences[rows] = np.where(result.valid, np.char.mod("%.2f%%", result.probabilities * 100), None)
+                            invalid[rows] = ~result.valid
+                            done[rows] = True
+                            n_done = int(done.sum())
+                            progress.progress(n_done / n_rows, text=f"Đã dự đoán {n_done}/{n_rows} dòng")
+                            # Chỉ vẽ lại tối đa PREVIEW_ROWS dòng đã có kết quả để giao diện không chậm với file lớn
+                            preview = np.flatnonzero(done)[:PREVIEW_ROWS]
+                            table.dataframe(df.iloc[preview].assign(**{'Dự đoán': predictions[preview],
+                                                                       'Độ tin cậy': confidences[preview]}))
+
+                    # 4. Gộp kết quả dự đoán vào DataFrame hiện tại
+                    df['Dự đoán'] = predictions
+                    df['Độ tin cậy'] = confidences
+
+                    # Hiển thị bảng kết quả với màu sắc (tùy chọn)
+                    table.dataframe(df)
+                    if invalid.any():
+                        st.warning(f"⚠️ {int(invalid.sum())} dòng không hợp lệ (thiếu giá trị hoặc ngoài miền cho phép) nên không được dự đoán.")
 
-                            # 5. Tạo file Excel để người dùng tải về
-                            output = io.BytesIO()
-                            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                df.to_excel(writer, index=False)
-                            
-                            st.download_button(
-                                label="📥 Tải xuống kết quả Full (.xlsx)",
-                                data=output.getvalue(),
-                                file_name="ket_qua_du_doan_hat_bi.xlsx",
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                            )
-                        else:
-                            st.error(f"❌ Lỗi từ Server (Mã lỗi: {response.status_code})")
-                            st.write(response.text)
+                    # 5. Tạo file Excel để người dùng tải về
+                    output = io.BytesIO()
+                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+                        df.to_excel(writer, index=False)
 
-                    except requests.exceptions.ConnectionError:
-                        st.error("❌ Không thể kết nối với Server API. Hãy đảm bảo file 'app.py' đang chạy (uvicorn).")
+                    st.download_button(
+                        label="📥 Tải xuống kết quả Full (.xlsx)",
+                        data=output.getvalue(),
+                        file_name="ket_qua_du_doan_hat_bi.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+                except ChunkError as e:
+                    # Các dòng đã dự đoán xong vẫn được giữ trên bảng
+                    st.error(f"❌ Lỗi từ Server: {e}")
+                    st.warning("Không thể kết nối với Server API? Hãy đảm bảo file 'main.py' đang chạy (uvicorn).")
         else:
             st.error(f"❌ File thiếu các cột sau: {', '.join(missing_cols)}")
             st.warning("Vui lòng kiểm tra lại định dạng file. Tên cột phải khớp chính xác tuyệt đối.")
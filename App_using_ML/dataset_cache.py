@@ -0,0 +1,198 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# Cache dạng cột cho file dữ liệu Excel/CSV: đọc file gốc (chậm) một lần, ghi mỗi cột thành một file .npy float64
+# và cột nhãn thành mảng mã số nguyên. Các lần sau mở bằng np.load(mmap_mode="r") nên gần như không tốn thời gian.
+# Cache tự build lại khi file gốc thay đổi (so kích thước + mtime, nếu khác thì so sha256).
+#
+#   df = read_dataset("Pumpkin_Seeds_Dataset.xlsx")          # thay cho pd.read_excel
+#   data = open_dataset("Pumpkin_Seeds_Dataset.xlsx")         # truy cập trực tiếp các cột mmap
+#   X = data.matrix(FEATURE_COLS); y = data.labels
+
+FORMAT_VERSION = 1
+LABEL_COLUMN = "Class"
+META_FILE = "meta.json"
+# Mặc định cache nằm cạnh file gốc trong thư mục ".dataset_cache"
+CACHE_DIR = os.environ.get("PUMPKIN_DATASET_CACHE_DIR")
+HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path_for(source, cache_dir=None):
+    # Một thư mục cache cho mỗi file gốc; thêm hash của đường dẫn tuyệt đối để hai file cùng tên không đè nhau
+    source = os.path.abspath(source)
+    root = cache_dir or CACHE_DIR or os.path.join(os.path.dirname(source), ".dataset_cache")
+    key = hashlib.sha1(source.encode("utf-8")).hexdigest()[:8]
+    return os.path.join(root, f"{os.path.basename(source)}-{key}")
+
+
+def read_source(source):
+    if source.endswith((".xlsx", ".xls")):
+        return pd.read_excel(source)
+    return pd.read_csv(source)
+
+
+def _read_meta(cache_path):
+    try:
+        with open(os.path.join(cache_path, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(cache_path, meta):
+    tmp = os.path.join(cache_path, META_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, os.path.join(cache_path, META_FILE))
+
+
+def _is_fresh(source, cache_path, meta, label_column):
+    # True nếu cache còn dùng được; cập nhật mtime trong meta khi file chỉ bị "touch" (nội dung không đổi)
+    if meta is None or meta.get("format_version") != FORMAT_VERSION or meta.get("label_column") != label_column:
+        return False
+    stat = os.stat(source)
+    if meta["source"]["size"] != stat.st_size:
+        return False
+    if meta["source"]["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    if file_sha256(source) != meta["source"]["sha256"]:
+        return False
+    meta["source"]["mtime_ns"] = stat.st_mtime_ns
+    _write_meta(cache_path, meta)
+    return True
+
+
+def build(source, cache_path, label_column=LABEL_COLUMN):
+    # Đọc file gốc và ghi cache vào thư mục tạm rồi đổi tên, để process khác không bao giờ thấy cache dở dang
+    stat = os.stat(source)
+    source_sha = file_sha256(source)
+    df = read_source(source)
+
+    parent = os.path.dirname(cache_path)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".building-", dir=parent)
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            if name == label_column:
+                continue
+            try:
+                numeric = pd.to_numeric(df[name])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Column '{name}' is not numeric: {e}")
+            file_name = f"col_{i:03d}.npy"
+            np.save(os.path.join(tmp_dir, file_name), numeric.to_numpy(dtype=np.float64))
+            # Lưu dtype gốc (ví dụ Area là int64) để frame() trả lại đúng kiểu như khi đọc file gốc
+            columns.append({"name": str(name), "file": file_name, "dtype": str(numeric.dtype),
+                            "sha256": file_sha256(os.path.join(tmp_dir, file_name))})
+
+        label = None
+        if label_column in df.columns:
+            # Mã nhãn theo thứ tự đã sắp xếp của tên lớp (Çerçevelik -> 0, Ürgüp Sivrisi -> 1), -1 nếu thiếu
+            categorical = pd.Categorical(df[label_column])
+            np.save(os.path.join(tmp_dir, "labels.npy"), categorical.codes.astype(np.int16))
+            label = {"file": "labels.npy", "classes": [str(c) for c in categorical.categories],
+                     "sha256": file_sha256(os.path.join(tmp_dir, "labels.npy"))}
+
+        _write_meta(tmp_dir, {
+            "format_version": FORMAT_VERSION,
+            "source": {"path": os.path.abspath(source), "size": stat.st_size,
+                       "mtime_ns": stat.st_mtime_ns, "sha256": source_sha},
+            "n_rows": len(df),
+            "column_order": [str(c) for c in df.columns],
+            "label_column": label_column,
+            "columns": columns,
+            "label": label,
+        })
+        shutil.rmtree(cache_path, ignore_errors=True)
+        os.replace(tmp_dir, cache_path)
+    except OSError:
+        # Một process khác vừa ghi xong cache cho cùng file: dùng bản của nó
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if _read_meta(cache_path) is None:
+            raise
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+class CachedDataset:
+    def __init__(self, cache_path, meta):
+        self.cache_path = cache_path
+        self.meta = meta
+        self.n_rows = meta["n_rows"]
+        self.column_order = meta["column_order"]
+        self.label_column = meta["label_column"]
+        # Mỗi cột là một memmap chỉ đọc: chỉ các trang thực sự được dùng mới được đọc từ đĩa
+        self.columns = {c["name"]: np.load(os.path.join(cache_path, c["file"]), mmap_mode="r")
+                        for c in meta["columns"]}
+        self.dtypes = {c["name"]: c["dtype"] for c in meta["columns"]}
+        label = meta["label"]
+        self.labels = np.load(os.path.join(cache_path, label["file"]), mmap_mode="r") if label else None
+        self.classes = np.array(label["classes"], dtype=object) if label else None
+
+    def __len__(self):
+        return self.n_rows
+
+    def matrix(self, columns, start=0, stop=None):
+        # Ma trận (n, len(columns)) float64 theo thứ tự cột yêu cầu
+        missing = [c for c in columns if c not in self.columns]
+        if missing:
+            raise KeyError(f"Missing columns: {missing}")
+        out = np.empty((len(range(self.n_rows)[start:stop]), len(columns)), dtype=np.float64)
+        for j, name in enumerate(columns):
+            out[:, j] = self.columns[name][start:stop]
+        return out
+
+    def decoded_labels(self, start=0, stop=None):
+        codes = np.asarray(self.labels[start:stop])
+        return np.where(codes >= 0, self.classes[np.maximum(codes, 0)], None)
+
+    def frame(self, start=0, stop=None):
+        # DataFrame giống kết quả pd.read_excel / pd.read_csv của file gốc (cùng thứ tự cột)
+        data = {}
+        for name in self.column_order:
+            if name == self.label_column:
+                data[name] = self.decoded_labels(start, stop)
+            else:
+                data[name] = self.columns[name][start:stop].astype(self.dtypes[name])
+        return pd.DataFrame(data, columns=self.column_order)
+
+    def iter_frames(self, chunk_rows):
+        for start in range(0, self.n_rows, chunk_rows):
+            yield self.frame(start, start + chunk_rows)
+
+    def verify(self):
+        # Kiểm tra lại checksum của từng file cột (đắt hơn mở cache, dùng khi nghi ngờ file hỏng)
+        entries = list(self.meta["columns"]) + ([self.meta["label"]] if self.meta["label"] else [])
+        return all(file_sha256(os.path.join(self.cache_path, e["file"])) == e["sha256"] for e in entries)
+
+
+def open_dataset(source, cache_dir=None, label_column=LABEL_COLUMN):
+    # Mở cache của file gốc, build (lại) nếu chưa có hoặc file gốc đã thay đổi
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+    cache_path = cache_path_for(source, cache_dir)
+    meta = _read_meta(cache_path)
+    if not _is_fresh(source, cache_path, meta, label_column):
+        build(source, cache_path, label_column)
+        meta = _read_meta(cache_path)
+    return CachedDataset(cache_path, meta)
+
+
+def read_dataset(source, cache_dir=None, label_column=LABEL_COLUMN):
+    return open_dataset(source, cache_dir, label_column).frame()
@@ -0,0 +1,331 @@
+import json
+import os
+import time
+
+import numpy as np
+from scipy.special import expit
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from my_transformers import OutlierHandler, CorrelationDropper
+from quantization import PRECISIONS, dequantize, quantize
+
+# Kích thước (byte) tối đa của một khối ma trận kernel, để vừa cache và giới hạn bộ nhớ
+KERNEL_BLOCK_BYTES = 2 * 1024 * 1024
+
+# Các mảng của kế hoạch được ghi ra file .npy để nhiều process cùng mmap (chỉ đọc) thay vì mỗi process một bản
+SHARED_ARRAYS = ("keep", "lower", "upper", "medians", "scale", "offset",
+                 "coef", "support_vectors", "sv_sq_norms", "dual_coef")
+SHARED_SCALARS = ("intercept", "sv_intercept", "gamma", "prob_a", "prob_b", "proba_method")
+
+# Độ chính xác lưu trữ của các mảng trọng số trong save() (quantize / dequantize: quantization.py).
+# Cận outlier, median và scaler luôn giữ float64 (nhỏ, và sai số ở đó đổi trực tiếp hàng nào bị coi là outlier).
+QUANTIZED_ARRAYS = ("coef", "support_vectors")
+
+
+# "Biên dịch" một Pipeline đã fit (OutlierHandler -> CorrelationDropper -> StandardScaler [-> Nystroem] -> clf)
+# thành một kế hoạch NumPy thuần: không còn DataFrame trung gian lúc dự đoán.
+class CompiledPipeline:
+    def __init__(self, columns, keep, lower, upper, medians, scale, offset, clf, feature_map=None):
+        self.columns = list(columns)   # thứ tự cột của ma trận đầu vào
+        self.keep = keep               # chỉ số các cột còn lại sau CorrelationDropper
+        self.lower = lower             # cận dưới / cận trên / median của các cột giữ lại
+        self.upper = upper
+        self.medians = medians
+        self.scale = scale             # StandardScaler gộp thành một phép affine: x * scale + offset
+        self.offset = offset
+        self.clf = clf
+        self.classes_ = clf.classes_
+        self.precision = "float64"
+
+        # Với LogisticRegression nhị phân, gộp luôn scaler vào coef/intercept
+        self.coef = None
+        self.intercept = None
+        if feature_map is None and isinstance(clf, LogisticRegression) and len(self.classes_) == 2:
+            w = clf.coef_.ravel()
+            self.coef = w * scale
+            self.intercept = float(clf.intercept_[0] + offset @ w)
+
+        # Với SVC(kernel='rbf', probability=True) nhị phân, tự tính kernel + Platt scaling
+        self.support_vectors = None
+        self.proba_method = "platt"
+        if feature_map is not None:
+            # Nystroem + LogisticRegression: decision = (K(z, mốc) @ normalization.T) @ w + b
+            #                                         = K(z, mốc) @ (normalization.T @ w) + b,
+            # tức cùng dạng với SVC nhưng chỉ với n_components điểm mốc, xác suất = sigmoid(decision)
+            components = feature_map.components_
+            self.support_vectors = components
+            self.sv_sq_norms = np.einsum("ij,ij->i", components, components)
+            self.dual_coef = feature_map.normalization_.T @ clf.coef_.ravel()
+            self.sv_intercept = float(clf.intercept_[0])
+            gamma = feature_map.gamma
+            self.gamma = float(gamma) if gamma is not None else 1.0 / components.shape[1]
+            self.proba_method = "logistic"
+        elif (isinstance(clf, SVC) and clf.kernel == "rbf" and len(self.classes_) == 2
+                and len(clf.probA_) == 1):
+            self.support_vectors = clf.support_vectors_
+            self.sv_sq_norms = np.einsum("ij,ij->i", clf.support_vectors_, clf.support_vectors_)
+            self.dual_coef = clf.dual_coef_.ravel()
+            self.sv_intercept = float(clf.intercept_[0])
+            self.gamma = float(clf._gamma)
+            self.prob_a = float(clf.probA_[0])
+            self.prob_b = float(clf.probB_[0])
+
+    @property
+    def self_contained(self):
+        # True nếu dự đoán chỉ cần các mảng của kế hoạch (LR / SVC RBF nhị phân), không cần object sklearn
+        return self.coef is not None or self.support_vectors is not None
+
+    def save(self, directory, precision="float64"):
+        # Ghi kế hoạch ra thư mục: mỗi mảng một file .npy + meta.json cho các giá trị vô hướng.
+        # precision="float16" / "int8": lưu coef (LR) / support vector ở độ chính xác thấp hơn.
+        # dual_coef giữ float32: phần lớn hệ số bằng đúng cận C nên sai số làm tròn cùng dấu cộng dồn
+        # qua hàng trăm support vector (float16 lệch xác suất tới ~0.03, trong khi mảng chỉ có n_SV phần tử).
+        if not self.self_contained:
+            raise ValueError(f"{type(self.clf).__name__} cannot be exported without its sklearn object")
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {list(PRECISIONS)}")
+        os.makedirs(directory, exist_ok=True)
+        scalars = {name: getattr(self, name, None) for name in SHARED_SCALARS}
+        arrays, scales = [], {}
+        for name in SHARED_ARRAYS:
+            value = getattr(self, name, None)
+            if value is None:
+                continue
+            if precision != "float64" and name == "sv_sq_norms":
+                # Tính lại từ support vector đã khôi phục khi load, để kernel nhất quán
+                continue
+            if precision != "float64" and name == "coef":
+                # coef của LR đã gộp scaler nên chênh nhau nhiều bậc giữa các cột (Area ~1e-4, Eccentricity ~10):
+                # lượng tử hóa trọng số trong không gian đã chuẩn hóa, khi load nhân lại với scale
+                weights = value / self.scale
+                value, scales[name] = quantize(weights, precision)
+                # intercept đã gộp offset @ w: tính lại với trọng số đã lượng tử hóa
+                scalars["intercept"] = self.intercept + float(self.offset @ (dequantize(value, scales[name]) - weights))
+            elif precision != "float64" and name in QUANTIZED_ARRAYS:
+                value, scales[name] = quantize(value, precision)
+            elif precision != "float64" and name == "dual_coef":
+                value = value.astype(np.float32)
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(value))
+            arrays.append(name)
+        meta = {
+            "columns": self.columns,
+            "classes": [str(c) for c in self.classes_],
+            "arrays": arrays,
+            "scalars": scalars,
+            "precision": precision,
+            "scales": scales,
+        }
+        with open(os.path.join(directory, "plan.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        # Đọc kế hoạch đã save(); với mmap_mode="r" các process cùng dùng chung một bản trong page cache
+        # (trừ các mảng lưu ở float16 / int8: được khôi phục thành bản float32 riêng của mỗi process)
+        with open(os.path.join(directory, "plan.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        plan = cls.__new__(cls)
+        plan.columns = meta["columns"]
+        plan.clf = None
+        plan.proba_method = "platt"
+        plan.precision = meta.get("precision", "float64")
+        plan.classes_ = np.array(meta["classes"], dtype=object)
+        scales = meta.get("scales", {})
+        for name in SHARED_ARRAYS:
+            value = None
+            if name in meta["arrays"]:
+                value = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+                if name in scales:
+                    value = dequantize(value, scales[name])
+            setattr(plan, name, value)
+        for name, value in meta["scalars"].items():
+            setattr(plan, name, value)
+        if "coef" in scales:
+            plan.coef = plan.coef * plan.scale
+        if plan.support_vectors is not None and plan.sv_sq_norms is None:
+            plan.sv_sq_norms = np.einsum("ij,ij->i", plan.support_vectors, plan.support_vectors)
+        return plan
+
+    def _prepare(self, X):
+        # Lấy các cột giữ lại và thay outlier bằng median trong một lần duy nhất
+        X = np.asarray(X, dtype=np.float64)[:, self.keep]
+        mask = (X < self.lower) | (X > self.upper)
+        np.copyto(X, self.medians, where=mask)
+        return X
+
+    def transform(self, X):
+        # Tương đương pipeline[:-1].transform(X): dữ liệu đã chuẩn hóa, sẵn sàng cho clf
+        X = self._prepare(X)
+        X *= self.scale
+        X += self.offset
+        return X
+
+    def decision_function(self, X):
+        if self.coef is not None:
+            return self._prepare(X) @ self.coef + self.intercept
+        if self.support_vectors is not None:
+            Z = self.transform(X)
+            block_rows = max(1, KERNEL_BLOCK_BYTES // (8 * len(self.support_vectors)))
+            return np.concatenate([self._svc_decision(Z[start:start + block_rows])
+                                   for start in range(0, len(Z), block_rows)] or [np.empty(0)])
+        return self.clf.decision_function(self.transform(X))
+
+    def predict_proba(self, X):
+        if self.coef is not None:
+            p = expit(self.decision_function(X))
+            return np.column_stack([1 - p, p])
+        if self.support_vectors is not None:
+            return self.predict_with_proba(X)[1]
+        return self.clf.predict_proba(self.transform(X))
+
+    def predict(self, X):
+        # Cùng quy tắc với predict_with_proba: nhãn = argmax xác suất
+        return self.classes_[self.predict_with_proba(X)[0]]
+
+    def _svc_decision(self, Z):
+        # Kernel RBF với toàn bộ support vector: ||z - sv||^2 = ||z||^2 + ||sv||^2 - 2 z.sv
+        # (tính bằng float32 nếu kế hoạch được load từ bản float16 / int8)
+        Z = Z.astype(self.support_vectors.dtype, copy=False)
+        sq_dist = Z @ self.support_vectors.T
+        sq_dist *= -2
+        sq_dist += np.einsum("ij,ij->i", Z, Z)[:, None]
+        sq_dist += self.sv_sq_norms
+        np.maximum(sq_dist, 0, out=sq_dist)
+        sq_dist *= -self.gamma
+        K = np.exp(sq_dist, out=sq_dist)
+        return K @ self.dual_coef + self.sv_intercept
+
+    def _svc_proba(self, decision):
+        if self.proba_method == "logistic":
+            p1 = expit(decision)
+            return np.column_stack([1 - p1, p1])
+
+        # Platt scaling như libsvm (giá trị quyết định của libsvm ngược dấu với sklearn)
+        r = expit(decision * self.prob_a - self.prob_b)
+        np.clip(r, 1e-7, 1 - 1e-7, out=r)
+        p0 = _libsvm_binary_probability(r)
+        return np.column_stack([p0, 1 - p0])
+
+    def predict_with_proba(self, X, block_rows=None, stages=None):
+        # Một lần chạy duy nhất trả về (class_ids, xác suất các lớp).
+        # Nhãn = argmax xác suất (sau Platt scaling với SVC) nên luôn khớp với predict_proba; SVC.predict
+        # dùng dấu của decision function và lệch khỏi quy tắc này ở khoảng 0.3% hàng sát biên.
+        # Với LR / Nystroem xác suất = sigmoid(decision) nên hai cách trùng nhau.
+        # Nếu truyền dict `stages`, thời gian (giây) của từng giai đoạn được cộng dồn vào đó.
+        timings = {"outlier_handling": 0.0, "scaling": 0.0, "model": 0.0}
+        clock = time.perf_counter
+        X = np.asarray(X, dtype=np.float64)
+        if self.support_vectors is not None:
+            if block_rows is None:
+                block_rows = max(1, KERNEL_BLOCK_BYTES // (8 * len(self.support_vectors)))
+            proba = np.empty((len(X), 2))
+            for start in range(0, len(X), block_rows):
+                stop = start + block_rows
+                t0 = clock()
+                Z = self._prepare(X[start:stop])
+                t1 = clock()
+                Z *= self.scale
+                Z += self.offset
+                t2 = clock()
+                proba[start:stop] = self._svc_proba(self._svc_decision(Z))
+                t3 = clock()
+                timings["outlier_handling"] += t1 - t0
+                timings["scaling"] += t2 - t1
+                timings["model"] += t3 - t2
+        else:
+            t0 = clock()
+            Z = self._prepare(X)
+            t1 = clock()
+            if self.coef is not None:
+                # Scaler đã được gộp vào coef/intercept
+                p = expit(Z @ self.coef + self.intercept)
+                proba = np.column_stack([1 - p, p])
+                t2 = t1
+            else:
+                Z *= self.scale
+                Z += self.offset
+                t2 = clock()
+                proba = self.clf.predict_proba(Z)
+            t3 = clock()
+            timings = {"outlier_handling": t1 - t0, "scaling": t2 - t1, "model": t3 - t2}
+        if stages is not None:
+            for name, seconds in timings.items():
+                stages[name] = stages.get(name, 0.0) + seconds
+        return proba.argmax(axis=1), proba
+
+
+def _libsvm_binary_probability(r):
+    # Phiên bản vector hóa của multiclass_probability() trong libsvm với k = 2.
+    # libsvm dừng lặp khi sai số < 0.005 / k nên kết quả lệch nhẹ khỏi r;
+    # tái hiện đúng vòng lặp để khớp với SVC.predict_proba
+    k = 2
+    eps = 0.005 / k
+    Q00 = (1 - r) ** 2
+    Q11 = r ** 2
+    Q01 = -(1 - r) * r
+    p0 = np.full_like(r, 1.0 / k)
+    p1 = np.full_like(r, 1.0 / k)
+    active = np.ones(len(r), dtype=bool)
+    for _ in range(max(100, k)):
+        Qp0 = Q00 * p0 + Q01 * p1
+        Qp1 = Q01 * p0 + Q11 * p1
+        pQp = p0 * Qp0 + p1 * Qp1
+        max_error = np.maximum(np.abs(Qp0 - pQp), np.abs(Qp1 - pQp))
+        active &= max_error >= eps
+        if not active.any():
+            break
+        # t = 0
+        diff = np.where(active, (-Qp0 + pQp) / Q00, 0.0)
+        p0 = p0 + diff
+        pQp = (pQp + diff * (diff * Q00 + 2 * Qp0)) / (1 + diff) / (1 + diff)
+        Qp0 = (Qp0 + diff * Q00) / (1 + diff)
+        Qp1 = (Qp1 + diff * Q01) / (1 + diff)
+        p0 = p0 / (1 + diff)
+        p1 = p1 / (1 + diff)
+        # t = 1
+        diff = np.where(active, (-Qp1 + pQp) / Q11, 0.0)
+        p1 = p1 + diff
+        p0 = p0 / (1 + diff)
+        p1 = p1 / (1 + diff)
+    return p0
+
+
+def compile_pipeline(pipeline, columns):
+    # columns: thứ tự cột của ma trận sẽ đưa vào CompiledPipeline (thường là REQUIRED_COLUMNS)
+    steps = [step for _, step in pipeline.steps]
+    if not (len(steps) in (4, 5)
+            and isinstance(steps[0], OutlierHandler)
+            and isinstance(steps[1], CorrelationDropper)
+            and isinstance(steps[2], StandardScaler)):
+        raise ValueError("Chỉ hỗ trợ Pipeline dạng OutlierHandler -> CorrelationDropper -> StandardScaler [-> Nystroem] -> clf")
+    outlier, dropper, scaler = steps[:3]
+    clf = steps[-1]
+    feature_map = steps[3] if len(steps) == 5 else None
+    if feature_map is not None and not (
+            isinstance(feature_map, Nystroem) and feature_map.kernel == "rbf" and not feature_map.kernel_params
+            and isinstance(clf, LogisticRegression) and len(clf.classes_) == 2):
+        raise ValueError("Bước ánh xạ đặc trưng chỉ hỗ trợ Nystroem(kernel='rbf') + LogisticRegression nhị phân")
+
+    columns = list(columns)
+    kept_columns = [col for col in columns if col not in dropper.to_drop_]
+    keep = np.array([columns.index(col) for col in kept_columns], dtype=np.intp)
+
+    # Cột không cần xử lý outlier có cận (-inf, +inf) nên không bao giờ bị thay
+    lower = np.full(len(kept_columns), -np.inf)
+    upper = np.full(len(kept_columns), np.inf)
+    medians = np.zeros(len(kept_columns))
+    for j, col in enumerate(kept_columns):
+        if col in outlier.bounds_:
+            lower[j], upper[j] = outlier.bounds_[col]
+            medians[j] = outlier.medians_[col]
+
+    # (x - mean) / std  ==  x * (1 / std) + (-mean / std)
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(len(kept_columns))
+    std = scaler.scale_ if scaler.scale_ is not None else np.ones(len(kept_columns))
+    scale = 1.0 / std
+    offset = -mean * scale
+
+    return CompiledPipeline(columns, keep, lower, upper, medians, scale, offset, clf, feature_map)
@@ -0,0 +1,401 @@
+import glob
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+# Hàng đợi job dự đoán cho file lớn:
+#   - file upload được ghi xuống đĩa, API trả job_id ngay (không giữ kết nối HTTP trong lúc dự đoán);
+#   - trạng thái job nằm trong SQLite (file .sqlite3), nên job đang chờ vẫn còn sau khi restart server;
+#   - một số cố định luồng worker nhận job, đọc file theo chunk, dự đoán và ghi dần kết quả ra file;
+#   - nhiều process (serve.py --workers N) dùng chung một DB: job được "nhận" bằng một UPDATE nguyên tử,
+#     và giới hạn số job chạy đồng thời được kiểm tra trên DB nên áp dụng cho mọi process cộng lại.
+
+STATUSES = ("queued", "running", "done", "failed", "cancelled")
+FINISHED = ("done", "failed", "cancelled")
+OUTPUT_FORMATS = {"csv": ".csv", "ndjson": ".ndjson"}
+INPUT_SUFFIXES = (".csv", ".xlsx", ".xls")
+COPY_BLOCK_BYTES = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    model TEXT,
+    filename TEXT NOT NULL,
+    upload_path TEXT NOT NULL,
+    result_path TEXT NOT NULL,
+    output_format TEXT NOT NULL,
+    chunk_rows INTEGER NOT NULL,
+    upload_bytes INTEGER NOT NULL,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    progress REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    owner_pid INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+PUBLIC_FIELDS = ("id", "status", "model", "filename", "output_format", "upload_bytes", "rows_done", "progress",
+                 "attempts", "error", "created_at", "started_at", "finished_at")
+
+
+class JobLost(Exception):
+    # Job không còn thuộc lượt nhận này (bị hủy, hoặc bị đưa lại hàng đợi và worker khác đã nhận)
+    pass
+
+
+def _pid_alive(pid):
+    # Chỉ kiểm tra được qua /proc (Linux); hệ khác coi như còn sống và dựa vào heartbeat
+    if not os.path.isdir("/proc"):
+        return True
+    return os.path.exists(f"/proc/{pid}")
+
+
+# Lưu trạng thái job trong SQLite. Mỗi thao tác mở một kết nối ngắn nên dùng được từ nhiều luồng và nhiều process.
+class JobStore:
+    def __init__(self, path, stale_seconds=300.0):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _execute(self, sql, params=()):
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params)
+        finally:
+            conn.close()
+
+    def add(self, job):
+        columns = ", ".join(job)
+        placeholders = ", ".join("?" for _ in job)
+        self._execute(f"INSERT INTO jobs ({columns}) VALUES ({placeholders})", tuple(job.values()))
+
+    def get(self, job_id):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row is not None else None
+
+    def list(self, status=None, limit=100):
+        conn = self._connect()
+        try:
+            if status is None:
+                rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?",
+                                    (status, limit)).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def count(self, status):
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def update(self, job_id, expected_status=None, owner=None, **fields):
+        # Với expected_status: chỉ cập nhật nếu job còn ở trạng thái đó; trả về False nếu không (ví dụ đã bị hủy).
+        # Với owner=(owner_pid, attempts): chỉ cập nhật nếu job vẫn thuộc đúng lượt nhận đó, để worker đã mất job
+        # (bị đưa lại hàng đợi rồi được nhận lại, kể cả bởi luồng khác cùng process) không ghi đè trạng thái mới.
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conditions, params = ["id = ?"], [job_id]
+        if expected_status is not None:
+            conditions.append("status = ?")
+            params.append(expected_status)
+        if owner is not None:
+            conditions.append("owner_pid = ? AND attempts = ?")
+            params.extend(owner)
+        cursor = self._execute(f"UPDATE jobs SET {assignments} WHERE {' AND '.join(conditions)}",
+                               (*fields.values(), *params))
+        return cursor.rowcount > 0
+
+    def requeue_orphans(self):
+        # Job "running" của process đã chết (restart / crash) hoặc lâu không có heartbeat được đưa lại hàng đợi
+        # và chạy lại từ đầu (file kết quả dở dang bị ghi đè)
+        now = time.time()
+        requeued = 0
+        for job in self.list("running", limit=-1):
+            stale = job["heartbeat_at"] is None or now - job["heartbeat_at"] > self.stale_seconds
+            if job["owner_pid"] is None or not _pid_alive(job["owner_pid"]) or stale:
+                cursor = self._execute("UPDATE jobs SET status = 'queued', owner_pid = NULL "
+                                       "WHERE id = ? AND status = 'running' AND owner_pid IS ?",
+                                       (job["id"], job["owner_pid"]))
+                requeued += cursor.rowcount
+        return requeued
+
+    def claim_next(self, max_running=None):
+        # Nhận job cũ nhất đang chờ; BEGIN IMMEDIATE khóa ghi nên hai worker không nhận trùng một job.
+        # Không nhận nếu đã có max_running job "running" (đếm trong cùng transaction, trên mọi process).
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if max_running is not None:
+                running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+                if running >= max_running:
+                    conn.execute("COMMIT")
+                    return None
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute("UPDATE jobs SET status = 'running', owner_pid = ?, started_at = ?, heartbeat_at = ?, "
+                         "attempts = attempts + 1, rows_done = 0, progress = 0, error = NULL WHERE id = ?",
+                         (os.getpid(), now, now, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        job = dict(row)
+        job.update(status="running", owner_pid=os.getpid(), started_at=now, heartbeat_at=now,
+                   attempts=row["attempts"] + 1)
+        return job
+
+    def delete(self, job_id):
+        self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+
+def iter_file_chunks(path, chunk_rows):
+    # (chunk DataFrame, tỉ lệ đã đọc). CSV đọc từng chunk (tỉ lệ theo số byte đã đọc);
+    # Excel phải đọc cả file rồi chia nhỏ (tỉ lệ theo số hàng).
+    if path.endswith(".csv"):
+        size = max(os.path.getsize(path), 1)
+        with open(path, "rb") as f:
+            for chunk in pd.read_csv(f, chunksize=chunk_rows):
+                yield chunk, min(f.tell() / size, 1.0)
+    else:
+        df = pd.read_excel(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].copy(), min((start + chunk_rows) / max(len(df), 1), 1.0)
+
+
+# Hàng đợi job + các luồng worker. score_chunk(model, df) -> df có thêm cột kết quả.
+class JobQueue:
+    def __init__(self, job_dir, score_chunk, max_workers=1, max_queued=100, chunk_rows=50000,
+                 poll_seconds=1.0, retention_seconds=86400.0, stale_seconds=300.0, max_running=None):
+        self.job_dir = job_dir
+        self.upload_dir = os.path.join(job_dir, "uploads")
+        self.result_dir = os.path.join(job_dir, "results")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        os.makedirs(self.result_dir, exist_ok=True)
+        self.store = JobStore(os.path.join(job_dir, "jobs.sqlite3"), stale_seconds)
+        self.score_chunk = score_chunk
+        self.max_workers = max_workers
+        # Số job chạy đồng thời tối đa của mọi process dùng chung job_dir (mặc định = max_workers)
+        self.max_running = max_workers if max_running is None else max_running
+        self.max_queued = max_queued
+        self.chunk_rows = chunk_rows
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        # Heartbeat từ luồng riêng, nhiều lần trong một khoảng stale_seconds: job sống không bị coi là mồ côi
+        # kể cả khi một chunk (hay đọc cả file Excel) chạy lâu hơn stale_seconds
+        self.heartbeat_seconds = stale_seconds / 5
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        requeued = self.store.requeue_orphans()
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
+        self._stopping.clear()
+        for i in range(self.max_workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=10.0):
+        # Job đang chạy dừng sau chunk hiện tại và được đưa lại hàng đợi cho lần khởi động sau
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, fileobj, filename, model=None, output_format="csv", chunk_rows=None):
+        suffix = os.path.splitext(filename or "")[1].lower()
+        if suffix not in INPUT_SUFFIXES:
+            raise ValueError(f"Unsupported file type '{suffix}': expected one of {list(INPUT_SUFFIXES)}")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"output_format must be one of {list(OUTPUT_FORMATS)}")
+        chunk_rows = chunk_rows or self.chunk_rows
+        if chunk_rows <= 0:
+            raise ValueError("chunk_rows must be positive")
+        if self.store.count("queued") >= self.max_queued:
+            raise OverflowError(f"Too many queued jobs (max {self.max_queued})")
+
+        job_id = uuid.uuid4().hex
+        upload_path = os.path.join(self.upload_dir, job_id + suffix)
+        # Ghi file tạm rồi đổi tên: worker không bao giờ thấy file upload dở dang
+        with open(upload_path + ".part", "wb") as out:
+            shutil.copyfileobj(fileobj, out, COPY_BLOCK_BYTES)
+        os.replace(upload_path + ".part", upload_path)
+        job = {
+            "id": job_id,
+            "status": "queued",
+            "model": model,
+            "filename": os.path.basename(filename),
+            "upload_path": upload_path,
+            "result_path": os.path.join(self.result_dir, job_id + OUTPUT_FORMATS[output_format]),
+            "output_format": output_format,
+            "chunk_rows": chunk_rows,
+            "upload_bytes": os.path.getsize(upload_path),
+            "rows_done": 0,
+            "progress": 0.0,
+            "attempts": 0,
+            "created_at": time.time(),
+        }
+        self.store.add(job)
+        self._wakeup.set()
+        return self.public(job)
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def list(self, status=None, limit=100):
+        return [self.public(job) for job in self.store.list(status, limit)]
+
+    @staticmethod
+    def public(job):
+        return {field: job.get(field) for field in PUBLIC_FIELDS}
+
+    def cancel(self, job_id):
+        # Job đang chờ: hủy ngay. Job đang chạy: dừng sau chunk hiện tại. Job đã xong: xóa job và các file.
+        job = self.store.get(job_id)
+        if job is None:
+            raise KeyError(job_id)
+        if job["status"] in FINISHED:
+            self._remove_files(job)
+            self.store.delete(job_id)
+            return "deleted"
+        # Job đang chạy (ở process này hay process khác) thấy trạng thái mới khi cập nhật tiến độ sau chunk hiện tại
+        self.store.update(job_id, status="cancelled", finished_at=time.time())
+        return "cancelled"
+
+    def stats(self):
+        return {
+            "max_workers": self.max_workers,
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "counts": {status: self.store.count(status) for status in STATUSES},
+        }
+
+    def _remove_files(self, job):
+        for path in (job["upload_path"], job["result_path"], *glob.glob(glob.escape(job["result_path"]) + ".*.part")):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _cleanup_expired(self):
+        # Xóa job đã kết thúc quá retention_seconds (cùng file upload và kết quả)
+        deadline = time.time() - self.retention_seconds
+        for status in FINISHED:
+            for job in self.store.list(status, limit=-1):
+                if job["finished_at"] is not None and job["finished_at"] < deadline:
+                    self._remove_files(job)
+                    self.store.delete(job["id"])
+
+    def _run(self):
+        last_cleanup = 0.0
+        while not self._stopping.is_set():
+            try:
+                if time.monotonic() - last_cleanup > 60:
+                    last_cleanup = time.monotonic()
+                    self.store.requeue_orphans()
+                    self._cleanup_expired()
+                job = self.store.claim_next(self.max_running)
+            except sqlite3.Error as e:
+                print(f"Job store error: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_seconds)
+                self._wakeup.clear()
+                continue
+            self._process(job)
+
+    def _heartbeat(self, job_id, owner, finished, lost):
+        while not finished.wait(self.heartbeat_seconds):
+            try:
+                if not self.store.update(job_id, "running", owner, heartbeat_at=time.time()):
+                    lost.set()
+                    return
+            except sqlite3.Error as e:
+                print(f"Job store error: {e}")
+
+    def _process(self, job):
+        job_id = job["id"]
+        owner = (job["owner_pid"], job["attempts"])
+        # File tạm riêng cho từng lượt nhận: worker đã mất job không ghi lẫn vào file của worker mới
+        part_path = f"{job['result_path']}.{owner[0]}-{owner[1]}.part"
+        rows_done = 0
+        finished, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job_id, owner, finished, lost),
+                                     name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        heartbeat.start()
+        try:
+            with open(part_path, "w", encoding="utf-8", newline="") as out:
+                header = True
+                for chunk, progress in iter_file_chunks(job["upload_path"], job["chunk_rows"]):
+                    if lost.is_set():
+                        raise JobLost()
+                    if self._stopping.is_set():
+                        # Server đang tắt: trả job về hàng đợi, lần khởi động sau chạy lại từ đầu
+                        self.store.update(job_id, "running", owner, status="queued", owner_pid=None)
+                        raise JobLost()
+                    labelled = self.score_chunk(job["model"], chunk)
+                    if job["output_format"] == "csv":
+                        labelled.to_csv(out, index=False, header=header)
+                        header = False
+                    else:
+                        out.write(labelled.to_json(orient="records", lines=True, force_ascii=False))
+                    rows_done += len(labelled)
+                    if not self.store.update(job_id, "running", owner, rows_done=rows_done,
+                                             progress=round(progress, 4), heartbeat_at=time.time()):
+                        raise JobLost()
+            # Kiểm tra lại quyền sở hữu ngay trước khi thay file kết quả
+            if not self.store.update(job_id, "running", owner, heartbeat_at=time.time()):
+                raise JobLost()
+            os.replace(part_path, job["result_path"])
+            self.store.update(job_id, "running", owner, status="done", progress=1.0, rows_done=rows_done,
+                              finished_at=time.time())
+        except JobLost:
+            # Chỉ xóa file tạm của lượt này; file kết quả (nếu có) thuộc lượt nhận mới hoặc được dọn khi xóa job
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        except Exception as e:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            self.store.update(job_id, "running", owner, status="failed", error=f"{type(e).__name__}: {e}",
+                              finished_at=time.time())
+        finally:
+            finished.set()
+            heartbeat.join()
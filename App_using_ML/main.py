@@ -1,51 +1,320 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse
+from contextlib import asynccontextmanager
 from pydantic import BaseModel,Field
-from typing import List
+from typing import List, Optional
 import joblib
 import pandas as pd
 import numpy as np
+import os
 from sklearn.base import BaseEstimator, TransformerMixin
 
+import metrics
+import shape_features
+import validation
 from my_transformers import OutlierHandler, CorrelationDropper
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from columnar import BINARY_MEDIA_TYPE, decode_binary, decode_columnar_json, encode_binary
+from job_queue import JobQueue
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Khởi động các worker job (và đưa lại hàng đợi các job bị gián đoạn bởi lần tắt trước)
+    job_queue.start()
+    yield
+    job_queue.stop()
 
-# Mô hình phân loại Logistic Regression
-#model_pipeline = joblib.load('model_pipeline.pkl')
+app = FastAPI(lifespan=lifespan)
+# Đo thời gian từng giai đoạn, xuất ra /metrics (định dạng Prometheus)
+metrics.install(app)
 
-#Mô hình phân loại SVM
-model_pipeline = joblib.load('model_svm_pipeline.pkl')
+# Các model có sẵn được tìm trong thư mục hiện tại và thư mục MLP, load khi dùng lần đầu:
+# - model_pipeline: Logistic Regression
+# - model_svm_pipeline: SVM (mặc định)
+# - pumpkin_model: MLP Keras (cần tensorflow)
+MODEL_DIRS = os.environ.get("PUMPKIN_MODEL_DIRS", os.pathsep.join([".", os.path.join("..", "Classification with MLP")]))
+DEFAULT_MODEL = os.environ.get("PUMPKIN_DEFAULT_MODEL", "model_svm_pipeline")
+MAX_LOADED_MODELS = int(os.environ.get("PUMPKIN_MAX_LOADED_MODELS", "2"))
+# Chế độ nhiều worker (serve.py): thư mục chứa các kế hoạch đã được master export, worker mmap thay vì load pickle
+SHARED_MODEL_DIR = os.environ.get("PUMPKIN_SHARED_MODEL_DIR")
+
+# Cache kết quả dự đoán, tắt mặc định (PUMPKIN_CACHE_SIZE=số hàng để bật): chỉ có lợi khi model chậm hơn
+# việc tra cache (SVM, MLP Keras), với LR đã biên dịch tra cache chậm hơn tính lại
+CACHE_SIZE = int(os.environ.get("PUMPKIN_CACHE_SIZE", "0"))
+CACHE_TTL_SECONDS = float(os.environ.get("PUMPKIN_CACHE_TTL", "3600"))
+CACHE_DECIMALS = int(os.environ.get("PUMPKIN_CACHE_DECIMALS", "4"))
+
+# Job dự đoán chạy nền cho file lớn (xem job_queue.py)
+JOB_DIR = os.environ.get("PUMPKIN_JOB_DIR", "job_data")
+JOB_WORKERS = int(os.environ.get("PUMPKIN_JOB_WORKERS", "1"))
+# Giới hạn chung cho mọi worker của serve.py --workers N (đếm trên DB job dùng chung)
+JOB_MAX_RUNNING = int(os.environ.get("PUMPKIN_JOB_MAX_RUNNING", str(JOB_WORKERS)))
+JOB_MAX_QUEUED = int(os.environ.get("PUMPKIN_JOB_MAX_QUEUED", "100"))
+JOB_CHUNK_ROWS = int(os.environ.get("PUMPKIN_JOB_CHUNK_ROWS", "50000"))
+JOB_RETENTION_HOURS = float(os.environ.get("PUMPKIN_JOB_RETENTION_HOURS", "24"))
 
 class SeedData(BaseModel): # Schema dữ liệu đầu vào
+    # Miền giá trị được kiểm tra theo cả batch trong validation.py (validation.RANGES), không theo từng hàng ở đây:
+    # hàng ngoài miền chỉ bị báo lỗi riêng thay vì làm cả request bị từ chối với 422
+
+    Area: float = Field(..., description="Diện tích hạt phải lớn hơn 0")
+    Perimeter: float = Field(..., description="Chu vi hạt phải lớn hơn 0")
+    Major_Axis_Length: float = Field(..., description="Chiều dài trục chính phải lớn hơn 0")
+    Minor_Axis_Length: float = Field(..., description="Chiều dài trục phụ phải lớn hơn 0")
+    Convex_Area: float = Field(..., description="Diện tích lồi phải lớn hơn 0")
+    Equiv_Diameter: float = Field(..., description="Đường kính tương đương phải lớn hơn 0")
+    Eccentricity: float = Field(..., description="Độ lệch tâm phải nằm trong khoảng (0, 1)")
+    Solidity: float = Field(..., description="Độ đặc phải nằm trong khoảng (0, 1)")
+    Extent: float = Field(..., description="Phạm vi phải nằm trong khoảng (0, 1)")
+    Roundness: float = Field(..., description="Độ tròn phải nằm trong khoảng (0, 1)")
+    Aspect_Ration: float = Field(..., description="Tỷ lệ khía cạnh phải nằm trong khoảng (0, 4)")
+    Compactness: float = Field(..., description="Độ gọn phải nằm trong khoảng (0, 1)")
+
+# Thứ tự 12 cột đặc trưng mà Pipeline yêu cầu (cũng là thứ tự cột của định dạng columnar)
+REQUIRED_COLUMNS = list(SeedData.model_fields)
 
-    Area: float = Field(..., gt=0, description="Diện tích hạt phải lớn hơn 0")
-    Perimeter: float = Field(..., gt=0, description="Chu vi hạt phải lớn hơn 0")
-    Major_Axis_Length: float = Field(..., gt=0, description="Chiều dài trục chính phải lớn hơn 0")
-    Minor_Axis_Length: float = Field(..., gt=0, description="Chiều dài trục phụ phải lớn hơn 0")
-    Convex_Area: float = Field(..., gt=0, description="Diện tích lồi phải lớn hơn 0")
-    Equiv_Diameter: float = Field(..., gt=0, description="Đường kính tương đương phải lớn hơn 0")
-    Eccentricity: float = Field(..., gt=0, lt=1, description="Độ lệch tâm phải nằm trong khoảng (0, 1)")
-    Solidity: float = Field(..., gt=0, lt=1, description="Độ đặc phải nằm trong khoảng (0, 1)")
-    Extent: float = Field(..., gt=0, lt=1, description="Phạm vi phải nằm trong khoảng (0, 1)")
-    Roundness: float = Field(..., gt=0, lt=1, description="Độ tròn phải nằm trong khoảng (0, 1)")
-    Aspect_Ration: float = Field(..., gt=0, lt=4, description="Tỷ lệ khía cạnh phải nằm trong khoảng (0, 4)")
-    Compactness: float = Field(..., gt=0, lt=1, description="Độ gọn phải nằm trong khoảng (0, 1)")
+# Pipeline sklearn được biên dịch thành kế hoạch NumPy khi load (không qua DataFrame lúc dự đoán)
+registry = ModelRegistry(MODEL_DIRS.split(os.pathsep), REQUIRED_COLUMNS, DEFAULT_MODEL, MAX_LOADED_MODELS,
+                         shared_dir=SHARED_MODEL_DIR)
+
+# Khi một model được load lại, kết quả cũ của model đó trong cache bị xóa
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL_SECONDS, CACHE_DECIMALS)
+registry.add_listener(prediction_cache.invalidate)
+
+def get_model(name: Optional[str]):
+    try:
+        return registry.get(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}. Available: {list(registry.discover())}")
 
 @app.post("/predict_batch")
-def predict_batch(data: List[SeedData]):
-    # 1. Chuyển List Pydantic sang DataFrame
-    df = pd.DataFrame([item.model_dump() for item in data])
-    
-    # 2. Dự đoán (Pipeline tự xử lý Outlier và Dropper bên trong)
-    predictions = model_pipeline.predict(df)
-    probabilities = model_pipeline.predict_proba(df).max(axis=1)
-    
-    # 3. Mapping nhãn
-    class_mapping = {1: "Ürgüp Sivrisi", 0: "Çerçevelik"}
-    results = [class_mapping.get(p, p) for p in predictions]
-    
-    return {
-        "predictions": results,
-        "probabilities": [f"{round(p * 100, 2)}%" for p in probabilities]
-    }
\ No newline at end of file
+def predict_batch(request: Request, data: List[SeedData], model: Optional[str] = None):
+    metrics.observe_parse(request)
+    endpoint = metrics.endpoint_label(request)
+    with metrics.maybe_profile(request) as profile:
+        # 1. Chuyển List Pydantic sang ma trận (n, 12) theo thứ tự REQUIRED_COLUMNS
+        with metrics.stage(endpoint, "build_matrix"):
+            # reshape: danh sách rỗng vẫn cho ma trận (0, 12) như /predict_batch_columnar
+            X = np.array([[getattr(item, col) for col in REQUIRED_COLUMNS] for item in data],
+                         dtype=np.float64).reshape(-1, len(REQUIRED_COLUMNS))
+        metrics.observe_rows(request, len(X))
+        with metrics.stage(endpoint, "validate"):
+            check = validation.validate(X, REQUIRED_COLUMNS)
+        
+        # 2. Dự đoán các hàng hợp lệ (kế hoạch đã biên dịch xử lý Outlier, Dropper và Scaler bên trong)
+        entry = get_model(model)
+        class_ids, probabilities = score_valid_rows(entry, X, check, endpoint)
+        
+        # 3. Mapping nhãn và tạo JSON trả về (hàng không hợp lệ: null, chi tiết trong "validation")
+        with metrics.stage(endpoint, "serialize"):
+            class_mapping = {1: "Ürgüp Sivrisi", 0: "Çerçevelik"}
+            results = [class_mapping.get(p, p) for p in class_labels(entry, class_ids).tolist()]
+            content = {
+                "predictions": results,
+                "probabilities": [f"{round(p * 100, 2)}%" if ok else None
+                                  for p, ok in zip(probabilities.tolist(), check.valid.tolist())]
+            }
+            if not check.all_valid:
+                content["validation"] = check.report()
+            response = JSONResponse(content)
+    return with_profile_header(response, profile)
+
+def score_matrix(entry, X: np.ndarray, endpoint: str = ""):
+    # Dự đoán trên ma trận (n, 12) -> (class_ids, xác suất của nhãn dự đoán)
+    # Một lần chạy kernel cho cả nhãn và xác suất (nhãn = argmax xác suất).
+    # Chỉ các hàng chưa có trong cache mới được đưa vào model.
+    stages = {}
+    with metrics.stage(endpoint, "predict"):
+        proba = prediction_cache.predict(X, (entry.name, entry.version),
+                                         lambda X_miss: entry.model.predict_with_proba(X_miss, stages=stages)[1])
+    metrics.observe_stages(endpoint, stages)
+    return proba.argmax(axis=1), proba.max(axis=1)
+
+def score_valid_rows(entry, X: np.ndarray, check, endpoint: str = ""):
+    # Chỉ đưa các hàng hợp lệ vào model; hàng không hợp lệ có class_id -1 và xác suất NaN
+    if check.all_valid:
+        return score_matrix(entry, X, endpoint)
+    class_ids = np.full(len(X), -1, dtype=np.int64)
+    probabilities = np.full(len(X), np.nan)
+    if check.valid.any():
+        class_ids[check.valid], probabilities[check.valid] = score_matrix(entry, X[check.valid], endpoint)
+    return class_ids, probabilities
+
+def class_labels(entry, class_ids: np.ndarray):
+    # class_id -> tên lớp, None cho hàng không hợp lệ (class_id -1)
+    labels = entry.model.classes_[np.maximum(class_ids, 0)].astype(object)
+    labels[class_ids < 0] = None
+    return labels
+
+def with_profile_header(response: Response, profile):
+    # Khi request bật profiler (header X-Profile: 1), trả về đường dẫn file profile
+    if profile["profile"] is not None:
+        response.headers["X-Profile-Report"] = profile["profile"]
+    return response
+
+def score_columnar(request: Request, entry, X: np.ndarray, is_binary: bool, raw_features: bool = False):
+    # Chạy trong threadpool: (tính đặc trưng dẫn xuất) + kiểm tra + dự đoán + tạo response cho /predict_batch_columnar
+    endpoint = metrics.endpoint_label(request)
+    with metrics.maybe_profile(request) as profile:
+        consistency = None
+        if raw_features:
+            with metrics.stage(endpoint, "derive_features"):
+                X = shape_features.expand(X, REQUIRED_COLUMNS)
+        with metrics.stage(endpoint, "validate"):
+            check = validation.validate(X, REQUIRED_COLUMNS)
+            if not raw_features and shape_features.CONSISTENCY_RTOL > 0:
+                consistency = shape_features.check_consistency(X, REQUIRED_COLUMNS)
+        class_ids, probabilities = score_valid_rows(entry, X, check, endpoint)
+
+        # Trả kết quả cùng định dạng với request
+        with metrics.stage(endpoint, "serialize"):
+            if is_binary:
+                # Hàng không hợp lệ: [-1, NaN]; số hàng lỗi trong header X-Invalid-Rows
+                response = Response(content=encode_binary(class_ids, probabilities), media_type=BINARY_MEDIA_TYPE)
+                response.headers["X-Invalid-Rows"] = str(check.n_invalid)
+                if consistency is not None:
+                    response.headers["X-Inconsistent-Rows"] = str(consistency.n_invalid)
+            else:
+                content = {
+                    "model": entry.name,
+                    "predictions": class_labels(entry, class_ids).tolist(),
+                    "class_ids": class_ids.tolist(),
+                    "probabilities": [p if ok else None for p, ok in zip(probabilities.tolist(), check.valid.tolist())],
+                }
+                if not check.all_valid:
+                    content["validation"] = check.report()
+                if consistency is not None and not consistency.all_valid:
+                    content["consistency"] = consistency.report()
+                response = JSONResponse(content)
+    return with_profile_header(response, profile)
+
+@app.post("/predict_batch_columnar")
+async def predict_batch_columnar(request: Request, model: Optional[str] = None, features: str = "full"):
+    # Định dạng theo cột, tránh tạo một object Pydantic cho mỗi hàng:
+    # - application/json: {"Area": [...], "Perimeter": [...], ...}
+    # - application/octet-stream: buffer float64 little-endian (n x 12) theo thứ tự REQUIRED_COLUMNS
+    # ?features=raw: chỉ gửi 6 số đo thô (shape_features.RAW_COLUMNS, binary n x 6 theo thứ tự đó),
+    # server tự tính 6 cột dẫn xuất còn lại
+    if features not in ("full", "raw"):
+        raise HTTPException(status_code=400, detail="features must be 'full' or 'raw'")
+    raw_features = features == "raw"
+    columns = shape_features.RAW_COLUMNS if raw_features else REQUIRED_COLUMNS
+    body = await request.body()
+    metrics.observe_parse(request)
+    endpoint = metrics.endpoint_label(request)
+    is_binary = request.headers.get("content-type", "").startswith(BINARY_MEDIA_TYPE)
+    with metrics.stage(endpoint, "decode"):
+        if is_binary:
+            X = decode_binary(body, len(columns))
+        else:
+            X = decode_columnar_json(body, columns)
+    metrics.observe_rows(request, len(X))
+
+    entry = await run_in_threadpool(get_model, model)
+    return await run_in_threadpool(score_columnar, request, entry, X, is_binary, raw_features)
+
+@app.get("/cache_stats")
+def cache_stats():
+    # Số lần hit / miss, tỉ lệ hit và kích thước của cache dự đoán
+    return prediction_cache.stats()
+
+@app.get("/models")
+def list_models():
+    # Danh sách model có sẵn, model đang nằm trong bộ nhớ, thời gian load và bộ nhớ của từng model
+    return registry.stats()
+
+@app.post("/models/{name}/reload", status_code=202)
+def reload_model(name: str):
+    # Load lại artifact (ví dụ sau khi train lại) ở nền rồi thay thế, không chặn request đang chạy
+    try:
+        started = registry.reload(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {name}")
+    return {"model": name, "status": "reloading" if started else "already reloading"}
+
+def score_job_chunk(model_name: Optional[str], df: pd.DataFrame):
+    # Chạy trong luồng worker của job: thêm cột Prediction / Probability / Error cho một chunk
+    # (hàng không hợp lệ không được dự đoán, lý do nằm ở cột Error).
+    # Không qua prediction_cache để một file lớn không đẩy hết kết quả của các request tương tác ra khỏi cache.
+    endpoint = "/jobs"
+    missing_cols = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing_cols:
+        raise ValueError(f"Missing columns: {missing_cols}")
+    entry = registry.get(model_name)
+    metrics.REQUEST_ROWS.observe(len(df), endpoint)
+    with metrics.stage(endpoint, "build_matrix"):
+        X = validation.to_matrix(df, REQUIRED_COLUMNS)
+    with metrics.stage(endpoint, "validate"):
+        check = validation.validate(X, REQUIRED_COLUMNS)
+    class_ids = np.full(len(X), -1, dtype=np.int64)
+    probabilities = np.full(len(X), np.nan)
+    if check.valid.any():
+        stages = {}
+        with metrics.stage(endpoint, "predict"):
+            ids, proba = entry.model.predict_with_proba(X[check.valid], stages=stages)
+        metrics.observe_stages(endpoint, stages)
+        class_ids[check.valid], probabilities[check.valid] = ids, proba.max(axis=1)
+    df["Prediction"] = class_labels(entry, class_ids)
+    df["Probability"] = probabilities
+    df["Error"] = check.messages
+    return df
+
+job_queue = JobQueue(JOB_DIR, score_job_chunk, max_workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED,
+                     chunk_rows=JOB_CHUNK_ROWS, retention_seconds=JOB_RETENTION_HOURS * 3600,
+                     max_running=JOB_MAX_RUNNING)
+
+def job_response(job: dict):
+    job = dict(job, status_url=f"/jobs/{job['id']}")
+    if job["status"] == "done":
+        job["result_url"] = f"/jobs/{job['id']}/result"
+    return job
+
+def get_job(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+@app.post("/jobs", status_code=202)
+def submit_job(file: UploadFile = File(...), model: Optional[str] = None, output_format: str = "csv",
+               chunk_rows: Optional[int] = None):
+    # Lưu file upload (CSV / Excel) xuống đĩa và trả job_id ngay; file được dự đoán ở nền theo từng chunk
+    if model is not None and model not in registry.discover():
+        raise HTTPException(status_code=404, detail=f"Unknown model: {model}. Available: {list(registry.discover())}")
+    try:
+        job = job_queue.submit(file.file, file.filename, model, output_format, chunk_rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OverflowError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return job_response(job)
+
+@app.get("/jobs")
+def list_jobs(status: Optional[str] = None, limit: int = 100):
+    return {"jobs": [job_response(job) for job in job_queue.list(status, limit)], **job_queue.stats()}
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    # Trạng thái (queued / running / done / failed / cancelled), số hàng đã xử lý và tiến độ (0..1)
+    return job_response(job_queue.public(get_job(job_id)))
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = get_job(job_id)
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job['status']}, result not available")
+    stem = os.path.splitext(job["filename"])[0]
+    suffix = os.path.splitext(job["result_path"])[1]
+    media_type = "text/csv" if suffix == ".csv" else "application/x-ndjson"
+    return FileResponse(job["result_path"], media_type=media_type, filename=f"{stem}_predictions{suffix}")
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    # Job chưa xong: hủy (job đang chạy dừng sau chunk hiện tại). Job đã xong: xóa job và file kết quả.
+    try:
+        return {"id": job_id, "status": job_queue.cancel(job_id)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
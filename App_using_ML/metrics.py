@@ -0,0 +1,223 @@
+import bisect
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from fastapi import Request
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+# Đo thời gian từng giai đoạn xử lý request (histogram) và xuất ra /metrics theo định dạng text của Prometheus.
+# Chi phí mỗi lần đo: 2 lần perf_counter + 1 lần bisect dưới lock.
+
+SECONDS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROWS_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = (256, 1024, 16 * 1024, 256 * 1024, 1024 ** 2, 16 * 1024 ** 2, 256 * 1024 ** 2, 1024 ** 3)
+
+# Bật profiler theo từng request bằng header "X-Profile: 1" (chỉ khi PUMPKIN_ALLOW_PROFILING=1)
+PROFILE_HEADER = "x-profile"
+ALLOW_PROFILING = os.environ.get("PUMPKIN_ALLOW_PROFILING", "0") == "1"
+PROFILE_DIR = os.environ.get("PUMPKIN_PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PUMPKIN_PROFILE_INTERVAL_MS", "1")) / 1000.0
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {}   # giá trị label -> [đếm theo bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            base = ",".join(f'{k}="{v}"' for k, v in zip(self.label_names, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram("pumpkin_stage_seconds", "Time spent in each request processing stage",
+                          SECONDS_BUCKETS, ("endpoint", "stage"))
+REQUEST_SECONDS = Histogram("pumpkin_request_seconds", "End-to-end request latency",
+                            SECONDS_BUCKETS, ("endpoint", "status"))
+REQUEST_ROWS = Histogram("pumpkin_request_rows", "Rows scored per request", ROWS_BUCKETS, ("endpoint",))
+PAYLOAD_BYTES = Histogram("pumpkin_request_payload_bytes", "Request body size", BYTES_BUCKETS, ("endpoint",))
+ALL_METRICS = [STAGE_SECONDS, REQUEST_SECONDS, REQUEST_ROWS, PAYLOAD_BYTES]
+
+
+# Nhãn chung cho request không khớp route nào (404), để quét URL không tạo thêm series
+UNMATCHED = "unmatched"
+
+
+def endpoint_label(request: Request):
+    # Nhãn endpoint = mẫu route (ví dụ /jobs/{job_id}), không phải đường dẫn thật:
+    # số series của mỗi histogram giới hạn theo số route thay vì tăng theo từng job id / tên model
+    route = request.scope.get("route")
+    return getattr(route, "path", UNMATCHED)
+
+
+@contextlib.contextmanager
+def stage(endpoint, name):
+    # Đo thời gian của một giai đoạn trong khối `with`
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, endpoint, name)
+
+
+def observe_stages(endpoint, stages):
+    # Ghi nhận các giai đoạn con do model trả về dạng {tên: giây}
+    for name, seconds in stages.items():
+        STAGE_SECONDS.observe(seconds, endpoint, name)
+
+
+def observe_rows(request: Request, n_rows):
+    REQUEST_ROWS.observe(n_rows, endpoint_label(request))
+
+
+def observe_parse(request: Request):
+    # Gọi ở đầu hàm endpoint. Thời gian từ khi request tới được chia thành:
+    #   read_body       đọc body (hoặc form multipart) cho tới khi đọc xong,
+    #   parse           json.loads body (chỉ khi FastAPI parse body JSON, xem TimedRequest),
+    #   schema_validate từ lúc parse xong tới khi vào endpoint: validate Pydantic của tham số body.
+    start = getattr(request.state, "metrics_start", None)
+    if start is None:
+        return
+    now = time.perf_counter()
+    endpoint = endpoint_label(request)
+    state = request.state
+    STAGE_SECONDS.observe(getattr(state, "metrics_body_read_at", now) - start, endpoint, "read_body")
+    parsed_at = getattr(state, "metrics_parsed_at", None)
+    if parsed_at is not None:
+        STAGE_SECONDS.observe(state.metrics_parse_seconds, endpoint, "parse")
+        STAGE_SECONDS.observe(now - parsed_at, endpoint, "schema_validate")
+
+
+# Request ghi lại lúc đọc xong body và thời gian parse JSON vào request.state (dùng chung với middleware),
+# để observe_parse tách được các giai đoạn FastAPI chạy trước khi gọi endpoint
+class TimedRequest(Request):
+    async def body(self):
+        if not hasattr(self, "_body"):
+            await super().body()
+            self.state.metrics_body_read_at = time.perf_counter()
+        return self._body
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            start = time.perf_counter()
+            self._json = json.loads(body)
+            self.state.metrics_parsed_at = time.perf_counter()
+            self.state.metrics_parse_seconds = self.state.metrics_parsed_at - start
+        return self._json
+
+
+class TimedRoute(APIRoute):
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request: Request):
+            return await handler(TimedRequest(request.scope, request.receive))
+        return timed_handler
+
+
+def install(app):
+    # Middleware đo tổng thời gian + kích thước payload, và endpoint /metrics.
+    # Gọi trước khi khai báo route: các route sau đó dùng TimedRoute.
+    app.router.route_class = TimedRoute
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        request.state.metrics_start = time.perf_counter()
+        response = await call_next(request)
+        # Route chỉ được gán vào scope khi router xử lý request, nên lấy nhãn sau call_next
+        endpoint = endpoint_label(request)
+        if endpoint != "/metrics":
+            REQUEST_SECONDS.observe(time.perf_counter() - request.state.metrics_start,
+                                    endpoint, str(response.status_code))
+            content_length = request.headers.get("content-length")
+            if content_length is not None:
+                PAYLOAD_BYTES.observe(int(content_length), endpoint)
+        return response
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return "\n".join(m.render() for m in ALL_METRICS) + "\n"
+
+
+# Profiler lấy mẫu: một luồng nền đọc stack của luồng đang xử lý request mỗi `interval` giây.
+# Kết quả ghi theo định dạng "collapsed stacks" (dùng được với flamegraph.pl / speedscope).
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def maybe_profile(request: Request):
+    # Dùng trong thân endpoint (cùng luồng với code cần đo). Trả về tên file profile hoặc None.
+    result = {"profile": None}
+    if not (ALLOW_PROFILING and request.headers.get(PROFILE_HEADER) == "1"):
+        yield result
+        return
+    profiler = SamplingProfiler(threading.get_ident())
+    with profiler:
+        yield result
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.txt")
+    profiler.dump(path)
+    result["profile"] = path
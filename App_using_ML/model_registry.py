@@ -0,0 +1,244 @@
+import glob
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from fast_pipeline import CompiledPipeline, compile_pipeline
+
+# Danh sách model đã export vào thư mục dùng chung (xem export_shared)
+SHARED_MANIFEST = "manifest.json"
+# Thư mục chứa file này là một kế hoạch đã save() (ví dụ bản float16 / int8 do quantize.py tạo)
+PLAN_FILE = "plan.json"
+
+# Nhãn của MLP (train_MLP.py mã hóa Çerçevelik -> 0, Ürgüp Sivrisi -> 1)
+KERAS_CLASSES = np.array(["Çerçevelik", "Ürgüp Sivrisi"], dtype=object)
+
+
+def _current_rss():
+    # Bộ nhớ thường trú (byte) của process, None nếu không có /proc (ví dụ Windows)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Bọc model Keras + scaler để có cùng giao diện predict_with_proba với CompiledPipeline
+class KerasModel:
+    def __init__(self, model, scaler, columns):
+        self.model = model
+        self.scaler = scaler
+        self.columns = list(columns)
+        self.classes_ = KERAS_CLASSES
+
+    def predict_with_proba(self, X, block_rows=None, stages=None):
+        t0 = time.perf_counter()
+        scaled = self.scaler.transform(pd.DataFrame(X, columns=self.columns))
+        t1 = time.perf_counter()
+        p1 = self.model.predict(scaled, verbose=0)[:, 0].astype(np.float64)
+        t2 = time.perf_counter()
+        if stages is not None:
+            stages["scaling"] = stages.get("scaling", 0.0) + t1 - t0
+            stages["model"] = stages.get("model", 0.0) + t2 - t1
+        proba = np.column_stack([1 - p1, p1])
+        return proba.argmax(axis=1), proba
+
+
+# Một phiên bản đã load của một artifact
+class ModelEntry:
+    def __init__(self, name, path, model, version, load_seconds, memory_bytes):
+        self.name = name
+        self.path = path
+        self.model = model
+        self.version = version
+        self.artifact_mtime = os.path.getmtime(path)
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+
+    def info(self):
+        return {
+            "name": self.name,
+            "path": self.path,
+            "version": self.version,
+            "artifact_mtime": self.artifact_mtime,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "memory_mb": round(self.memory_bytes / 1024 / 1024, 3),
+        }
+
+
+# Danh mục model: tìm artifact (*.pkl, *.keras), load khi dùng lần đầu, giữ tối đa max_loaded
+# model trong bộ nhớ (LRU) và hỗ trợ hot reload: load bản mới ở nền rồi thay thế nguyên tử.
+class ModelRegistry:
+    def __init__(self, search_dirs, columns, default_model, max_loaded=2, shared_dir=None):
+        self.search_dirs = list(search_dirs)
+        self.shared_dir = shared_dir        # thư mục các kế hoạch đã export (chế độ nhiều worker)
+        self._shared = self._read_manifest() if shared_dir else {}
+        self.columns = list(columns)
+        self.default_model = default_model
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()        # name -> ModelEntry
+        self._versions = {}                 # name -> số lần đã load
+        self._lock = threading.Lock()       # bảo vệ _loaded (giữ rất ngắn)
+        self._load_locks = {}               # name -> lock tránh load trùng một model
+        self._reloading = set()
+        self._listeners = []                # callback(name) khi một model được thay bằng bản mới
+
+    def discover(self):
+        # Trả về {tên model: đường dẫn}, tên là tên file không có phần mở rộng (hoặc tên thư mục kế hoạch)
+        found = {}
+        for directory in self.search_dirs:
+            for pattern in ("*.pkl", "*.keras"):
+                for path in sorted(glob.glob(os.path.join(directory, pattern))):
+                    found.setdefault(os.path.splitext(os.path.basename(path))[0], path)
+            for plan_file in sorted(glob.glob(os.path.join(directory, "*", PLAN_FILE))):
+                path = os.path.dirname(plan_file)
+                found.setdefault(os.path.basename(path), path)
+        return found
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, name):
+        for callback in self._listeners:
+            callback(name)
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.shared_dir, SHARED_MANIFEST), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def export_shared(self, directory):
+        # Gọi ở process master: compile các pipeline sklearn một lần và ghi mảng ra .npy để các worker mmap.
+        # Model không tự chứa được (Keras, classifier không có đường tính sẵn) vẫn được mỗi worker load riêng.
+        manifest = {}
+        for name, path in self.discover().items():
+            if not path.endswith(".pkl"):
+                continue
+            plan = compile_pipeline(joblib.load(path), self.columns)
+            if not plan.self_contained:
+                print(f"Model '{name}' is not exportable: each worker loads its own copy")
+                continue
+            plan.save(os.path.join(directory, name))
+            manifest[name] = {"path": os.path.abspath(path), "mtime": os.path.getmtime(path)}
+        with open(os.path.join(directory, SHARED_MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        return manifest
+
+    def _load_model(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        shared = self._shared.get(name)
+        # Dùng bản dùng chung chỉ khi artifact chưa đổi kể từ lúc export (reload sau khi train lại -> load riêng)
+        if shared is not None and shared["mtime"] == os.path.getmtime(path):
+            return CompiledPipeline.load(os.path.join(self.shared_dir, name))
+        if os.path.isdir(path):
+            return CompiledPipeline.load(path)
+        if path.endswith(".keras"):
+            # Import tensorflow chỉ khi thực sự cần model Keras
+            import tensorflow as tf
+            scaler_path = os.path.join(os.path.dirname(path), "scaler.joblib")
+            return KerasModel(tf.keras.models.load_model(path), joblib.load(scaler_path), self.columns)
+        return compile_pipeline(joblib.load(path), self.columns)
+
+    def _load_entry(self, name, path):
+        # Đo thời gian load và bộ nhớ tăng thêm (RSS trên Linux, tracemalloc trên hệ khác)
+        use_rss = _current_rss() is not None
+        already_tracing = tracemalloc.is_tracing()
+        if not use_rss and not already_tracing:
+            tracemalloc.start()
+        start_mem = _current_rss() if use_rss else tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            model = self._load_model(path)
+        finally:
+            load_seconds = time.perf_counter() - start
+            end_mem = _current_rss() if use_rss else tracemalloc.get_traced_memory()[0]
+            memory_bytes = end_mem - start_mem
+            if not use_rss and not already_tracing:
+                tracemalloc.stop()
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+        return ModelEntry(name, path, model, version, load_seconds, max(memory_bytes, 0))
+
+    def _install(self, entry):
+        # Thay thế nguyên tử: request đang chạy vẫn giữ tham chiếu tới bản cũ
+        with self._lock:
+            replaced = entry.name in self._loaded
+            self._loaded[entry.name] = entry
+            self._loaded.move_to_end(entry.name)
+            evicted = []
+            while len(self._loaded) > self.max_loaded:
+                evicted.append(self._loaded.popitem(last=False)[0])
+        if replaced:
+            self._notify(entry.name)
+        for name in evicted:
+            print(f"Model '{name}' evicted from memory (max_loaded={self.max_loaded})")
+
+    def get(self, name=None):
+        name = name or self.default_model
+        with self._lock:
+            entry = self._loaded.get(name)
+            if entry is not None:
+                self._loaded.move_to_end(name)
+                return entry
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        with load_lock:
+            # Một request khác có thể vừa load xong trong lúc chờ lock
+            with self._lock:
+                entry = self._loaded.get(name)
+            if entry is not None:
+                return entry
+            path = self.discover().get(name)
+            if path is None:
+                raise KeyError(name)
+            entry = self._load_entry(name, path)
+            self._install(entry)
+            return entry
+
+    def reload(self, name):
+        # Load lại artifact ở luồng nền; bản cũ tiếp tục phục vụ cho tới khi bản mới sẵn sàng
+        path = self.discover().get(name)
+        if path is None:
+            raise KeyError(name)
+        with self._lock:
+            if name in self._reloading:
+                return False
+            self._reloading.add(name)
+
+        def run():
+            try:
+                self._install(self._load_entry(name, path))
+            except Exception as e:
+                print(f"Error reloading model '{name}': {e}")
+            finally:
+                with self._lock:
+                    self._reloading.discard(name)
+
+        threading.Thread(target=run, name=f"reload-{name}", daemon=True).start()
+        return True
+
+    def stats(self):
+        with self._lock:
+            loaded = {name: entry.info() for name, entry in self._loaded.items()}
+            reloading = sorted(self._reloading)
+        return {
+            "default_model": self.default_model,
+            "max_loaded": self.max_loaded,
+            "shared_dir": self.shared_dir,
+            "shared_models": sorted(self._shared),
+            "available": self.discover(),
+            "loaded": loaded,
+            "reloading": reloading,
+        }
@@ -0,0 +1,201 @@
+import threading
+import time
+import numpy as np
+
+
+# Cache kết quả dự đoán trong process, khóa = (định danh model, vector 12 đặc trưng đã làm tròn).
+# Giới hạn số phần tử (loại bỏ theo LRU) và thời gian sống (TTL) của mỗi phần tử.
+#
+# Mọi bước đều chạy trên cả batch, không tạo object Python cho từng hàng:
+#   - khóa là hash 64 bit của hàng đã làm tròn (vài phép toán NumPy trên cả ma trận);
+#   - chỉ mục hash -> slot là mảng hash đã sắp xếp, tra bằng np.searchsorted;
+#   - kết quả, hàng gốc, thời điểm hết hạn và lần dùng cuối nằm trong các mảng NumPy theo slot.
+# Hàng gốc được so lại khi hit nên hai hàng trùng hash không bao giờ nhận nhầm kết quả của nhau.
+# LRU theo lượt gọi: khi đầy, loại cùng lúc ít nhất 1/8 dung lượng gồm các slot lâu không dùng nhất.
+
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class PredictionCache:
+    def __init__(self, max_entries=100000, ttl_seconds=3600.0, decimals=4):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.decimals = decimals
+        self._lock = threading.Lock()
+        self._namespaces = {}               # namespace -> id (số nguyên, trộn vào hash)
+        self._next_namespace_id = 0         # id không dùng lại sau invalidate, tránh trùng với slot cũ
+        self._clear_slots()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _clear_slots(self):
+        self._index_keys = np.empty(0, dtype=np.uint64)    # hash đã sắp xếp
+        self._index_slots = np.empty(0, dtype=np.int64)    # slot tương ứng
+        self._rows = None                   # (max_entries, n_features) hàng đã làm tròn
+        self._values = None                 # (max_entries, ...) kết quả
+        self._owner = np.full(self.max_entries, -1, dtype=np.int64)        # id namespace, -1 = slot trống
+        self._expires = np.zeros(self.max_entries, dtype=np.float64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self._free = np.arange(self.max_entries, dtype=np.int64)   # ngăn xếp slot trống: _free[:_n_free]
+        self._n_free = self.max_entries
+        self._tick = 0
+
+    def round_rows(self, X):
+        # Làm tròn tới `decimals` chữ số thập phân (+ 0.0 để -0.0 và 0.0 trùng khóa)
+        return np.ascontiguousarray(np.round(np.asarray(X, dtype=np.float64), self.decimals) + 0.0)
+
+    def row_hashes(self, Xq, namespace_id):
+        # Hash 64 bit cho từng hàng: trộn lần lượt từng cột (xor rồi nhân, tràn số là chủ ý)
+        bits = Xq.view(np.uint64)
+        h = np.full(len(Xq), namespace_id + 1, dtype=np.uint64)
+        h *= _HASH_MULTIPLIER
+        for j in range(bits.shape[1]):
+            h ^= bits[:, j]
+            h *= _HASH_MULTIPLIER
+            h ^= h >> np.uint64(29)
+        return h
+
+    def _lookup(self, keys):
+        # hash -> slot, -1 nếu chưa có
+        if len(self._index_keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        pos = np.searchsorted(self._index_keys, keys)
+        pos[pos == len(self._index_keys)] = 0
+        return np.where(self._index_keys[pos] == keys, self._index_slots[pos], -1)
+
+    def _namespace_id(self, namespace):
+        ns_id = self._namespaces.get(namespace)
+        if ns_id is None:
+            ns_id = self._namespaces[namespace] = self._next_namespace_id
+            self._next_namespace_id += 1
+        return ns_id
+
+    def predict(self, X, namespace, predict_fn):
+        # Chia batch thành hit / miss, chỉ gọi predict_fn (ma trận -> mảng kết quả theo hàng) cho các hàng miss
+        X = np.asarray(X, dtype=np.float64)
+        if not self.enabled or len(X) == 0:
+            return predict_fn(X)
+
+        Xq = self.round_rows(X)
+        with self._lock:
+            ns_id = self._namespace_id(namespace)
+            keys = self.row_hashes(Xq, ns_id)
+            now = time.monotonic()
+            slots = self._lookup(keys)
+            hit = slots >= 0
+            if hit.any() and self._rows is not None and self._rows.shape[1] == Xq.shape[1]:
+                found = slots[hit]
+                hit[hit] = ((self._owner[found] == ns_id) & (self._expires[found] >= now)
+                            & (self._rows[found] == Xq[hit]).all(axis=1))
+            else:
+                hit[:] = False
+            hit_slots = slots[hit]
+            self._tick += 1
+            self._last_used[hit_slots] = self._tick
+            cached = self._values[hit_slots] if len(hit_slots) else None
+            n_hits = len(hit_slots)
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+
+        if n_hits == len(keys):
+            return cached
+
+        miss = ~hit
+        computed = np.asarray(predict_fn(X[miss]))
+        results = np.empty((len(X),) + computed.shape[1:], dtype=computed.dtype)
+        results[miss] = computed
+        if n_hits:
+            results[hit] = cached
+        with self._lock:
+            self._store(keys[miss], Xq[miss], computed, ns_id, now + self.ttl_seconds)
+        return results
+
+    def _store(self, keys, rows, values, ns_id, expires_at):
+        # Ghi các hàng miss vào slot trống (khóa trùng trong batch: giữ lần xuất hiện đầu)
+        keys, first = np.unique(keys, return_index=True)
+        rows, values = rows[first], values[first]
+        if len(keys) > self.max_entries:
+            keys, rows, values = keys[:self.max_entries], rows[:self.max_entries], values[:self.max_entries]
+        if self._values is None or self._values.shape[1:] != values.shape[1:] or self._rows.shape[1] != rows.shape[1]:
+            # Lần ghi đầu (hoặc dạng kết quả thay đổi): cấp phát mảng theo dạng của kết quả
+            self._clear_slots()
+            self._rows = np.empty((self.max_entries, rows.shape[1]), dtype=np.float64)
+            self._values = np.empty((self.max_entries,) + values.shape[1:], dtype=values.dtype)
+
+        # Khóa đã có slot (hết hạn / đụng hash) được ghi đè tại chỗ, còn lại lấy slot trống
+        existing = self._lookup(keys)
+        is_new = existing < 0
+        n_new = int(np.count_nonzero(is_new))
+        if n_new > self._n_free:
+            # Không loại slot của các khóa sắp được ghi đè: slot đó sẽ bị cấp lại cho khóa mới,
+            # hai khóa dùng chung một slot và khóa cũ mất khỏi chỉ mục
+            self._evict(max(n_new - self._n_free, self.max_entries // 8), protected=existing[~is_new])
+        self._n_free -= n_new
+        new_slots = self._free[self._n_free:self._n_free + n_new].copy()
+        slots = existing.copy()
+        slots[is_new] = new_slots
+        # keys đã được np.unique sắp xếp nên chèn một lần vào chỉ mục
+        pos = np.searchsorted(self._index_keys, keys[is_new])
+        self._index_keys = np.insert(self._index_keys, pos, keys[is_new])
+        self._index_slots = np.insert(self._index_slots, pos, new_slots)
+
+        self._rows[slots] = rows
+        self._values[slots] = values
+        self._owner[slots] = ns_id
+        self._expires[slots] = expires_at
+        self._last_used[slots] = self._tick
+
+    def _evict(self, count, protected=None):
+        # Loại `count` slot dùng lâu nhất trong các slot đang có dữ liệu (trừ các slot `protected`)
+        in_use = self._owner >= 0
+        if protected is not None:
+            in_use[protected] = False
+        used = np.flatnonzero(in_use)
+        count = min(count, len(used))
+        victims = used[np.argpartition(self._last_used[used], count - 1)[:count]] if count < len(used) else used
+        self._release(victims)
+        self.evictions += len(victims)
+
+    def _release(self, slots):
+        self._owner[slots] = -1
+        keep = self._owner[self._index_slots] >= 0
+        self._index_keys, self._index_slots = self._index_keys[keep], self._index_slots[keep]
+        self._free[self._n_free:self._n_free + len(slots)] = slots
+        self._n_free += len(slots)
+
+    def invalidate(self, model_name):
+        # Xóa mọi kết quả của một model (gọi khi model được load lại)
+        with self._lock:
+            stale_namespaces = [namespace for namespace in self._namespaces
+                                if isinstance(namespace, tuple) and namespace[0] == model_name]
+            ids = [self._namespaces.pop(namespace) for namespace in stale_namespaces]
+            stale = np.flatnonzero(np.isin(self._owner, ids)) if ids else np.empty(0, dtype=np.int64)
+            self._release(stale)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._clear_slots()
+            self._namespaces.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "size": len(self._index_keys),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "decimals": self.decimals,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,124 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.model_selection import train_test_split
+
+from dataset_cache import read_dataset
+from fast_pipeline import PRECISIONS, CompiledPipeline, compile_pipeline
+
+# Export các pipeline sklearn (SVM / LR) thành kế hoạch NumPy với trọng số float16 hoặc int8,
+# mỗi bản được kiểm tra trên tập test giữ lại (cùng cách chia 80/10/10, random_state=42 như train_SVM.py / train_LR.py):
+# tỉ lệ nhãn khác bản đầy đủ và mức giảm accuracy phải dưới ngưỡng, nếu không bản đó không được ghi ra.
+# Thư mục kết quả (ví dụ model_svm_pipeline_int8/) nằm cạnh main.py được API tìm thấy như một model: ?model=model_svm_pipeline_int8
+#
+#   python quantize.py --data D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx
+#   python quantize.py --synthetic 20000 --precisions int8
+
+THROUGHPUT_ROWS = 200000
+
+
+def load_data(args):
+    if args.synthetic:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+        import synthetic
+        return synthetic.generate(args.synthetic, outlier_rate=0.01)
+    # Đọc qua cache cột (dataset_cache.py) như train_SVM.py / train_LR.py, để tập test trùng với lúc train
+    df = read_dataset(args.data)
+    return df.drop(columns=["Class"]), df["Class"]
+
+
+def held_out_split(X, y):
+    # Phần test của cách chia train / val / test trong train_SVM.py và train_LR.py
+    _, X_temp, _, y_temp = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    _, X_test, _, y_test = train_test_split(X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp)
+    return X_test, y_test
+
+
+def directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def array_bytes(plan):
+    # Bộ nhớ của các mảng mà kế hoạch giữ lúc phục vụ
+    return sum(value.nbytes for value in vars(plan).values() if isinstance(value, np.ndarray) and value.dtype != object)
+
+
+def throughput(plan, X):
+    plan.predict_with_proba(X[:1000])
+    start = time.perf_counter()
+    plan.predict_with_proba(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export float16 / int8 variants of the sklearn pipelines with an accuracy gate")
+    parser.add_argument("--data", default=os.environ.get("PUMPKIN_DATASET"))
+    parser.add_argument("--synthetic", type=int, default=None, help="Dùng N hàng dữ liệu giả lập thay cho --data")
+    parser.add_argument("--models", nargs="+", default=["model_svm_pipeline", "model_pipeline"])
+    parser.add_argument("--precisions", nargs="+", choices=PRECISIONS[1:], default=list(PRECISIONS[1:]))
+    parser.add_argument("--max-disagreement", type=float, default=0.005,
+                        help="Tỉ lệ hàng test tối đa được phép có nhãn khác bản đầy đủ")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    parser.add_argument("--out", default=".", help="Thư mục ghi các kế hoạch đã export")
+    args = parser.parse_args()
+    if not args.data and not args.synthetic:
+        parser.error("--data (or PUMPKIN_DATASET) or --synthetic is required")
+
+    X, y = load_data(args)
+    columns = list(X.columns)
+    X_test, y_test = held_out_split(X, y)
+    X_test, y_test = X_test.to_numpy(dtype=np.float64), y_test.to_numpy()
+    X_bench = np.resize(X_test, (THROUGHPUT_ROWS, X_test.shape[1]))
+
+    rows = []
+    rejected = []
+    for name in args.models:
+        full = compile_pipeline(joblib.load(f"{name}.pkl"), columns)
+        ref_ids, ref_proba = full.predict_with_proba(X_test)
+        ref_accuracy = np.mean(full.classes_[ref_ids] == y_test)
+        with tempfile.TemporaryDirectory() as tmp:
+            full.save(tmp)
+            rows.append((name, "float64", directory_bytes(tmp), array_bytes(full), throughput(full, X_bench),
+                         ref_accuracy, 1.0, 0.0, "reference"))
+
+        for precision in args.precisions:
+            target = os.path.join(args.out, f"{name}_{precision}")
+            tmp = tempfile.mkdtemp(prefix=f".{name}_{precision}-", dir=args.out)
+            try:
+                full.save(tmp, precision)
+                plan = CompiledPipeline.load(tmp)
+                ids, proba = plan.predict_with_proba(X_test)
+                agreement = np.mean(ids == ref_ids)
+                accuracy = np.mean(plan.classes_[ids] == y_test)
+                max_diff = float(np.abs(proba - ref_proba).max())
+                passed = 1 - agreement <= args.max_disagreement and ref_accuracy - accuracy <= args.max_accuracy_drop
+                rows.append((name, precision, directory_bytes(tmp), array_bytes(plan), throughput(plan, X_bench),
+                             accuracy, agreement, max_diff, "saved" if passed else "rejected"))
+                if passed:
+                    # Ghi đè bản cũ chỉ khi bản mới đã qua kiểm tra
+                    shutil.rmtree(target, ignore_errors=True)
+                    os.replace(tmp, target)
+                else:
+                    rejected.append(target)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"\n{'Model':<22}{'Precision':<10}{'Size (KB)':>10}{'Memory (KB)':>12}{'Rows/s':>12}"
+          f"{'Accuracy':>10}{'Agreement':>11}{'Max |dp|':>10}  Status")
+    for name, precision, size, memory, rows_per_s, accuracy, agreement, max_diff, status in rows:
+        print(f"{name:<22}{precision:<10}{size / 1024:>10.1f}{memory / 1024:>12.1f}{rows_per_s:>12.0f}"
+              f"{accuracy:>10.4f}{agreement:>11.4f}{max_diff:>10.1e}  {status}")
+    print(f"Held-out rows: {len(X_test)}")
+    if rejected:
+        print(f"Rejected (not written): {rejected}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
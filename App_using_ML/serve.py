@@ -0,0 +1,61 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+# Chạy API với nhiều worker uvicorn dùng chung một bản model chỉ đọc:
+#   - process master compile các pipeline sklearn một lần và ghi các mảng (support vector, coef, cận outlier...)
+#     ra file .npy trong /dev/shm (bộ nhớ dùng chung, không ghi xuống đĩa);
+#   - mỗi worker mở các file đó bằng np.load(mmap_mode="r"): các trang nhớ được chia sẻ giữa các process,
+#     không worker nào giữ bản sao riêng.
+#
+#   python serve.py --workers 4
+#   python serve.py --workers 4 --no-share      # so sánh: mỗi worker tự load pickle
+
+
+def shared_memory_root():
+    # /dev/shm là tmpfs trên Linux; hệ khác dùng thư mục tạm (vẫn chia sẻ qua page cache)
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def export_models(directory):
+    # Chạy trong process con: dùng cấu hình registry của main (thư mục model, thứ tự cột) để export,
+    # nhờ vậy master không phải giữ sklearn / pandas trong bộ nhớ suốt thời gian phục vụ
+    import main as service
+    exported = service.registry.export_shared(directory)
+    print(f"Exported {sorted(exported)} to {directory}")
+
+
+def serve():
+    parser = argparse.ArgumentParser(description="Serve App_using_ML with N workers sharing read-only model memory")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shared-dir", default=None, help="Thư mục export model (mặc định: thư mục tạm trong /dev/shm)")
+    parser.add_argument("--no-share", action="store_true", help="Không export: mỗi worker load model riêng")
+    args = parser.parse_args()
+
+    directory = None
+    if args.no_share:
+        os.environ.pop("PUMPKIN_SHARED_MODEL_DIR", None)
+    else:
+        directory = args.shared_dir or tempfile.mkdtemp(prefix="pumpkin-models-", dir=shared_memory_root())
+        os.makedirs(directory, exist_ok=True)
+        exporter = multiprocessing.get_context("spawn").Process(target=export_models, args=(directory,))
+        exporter.start()
+        exporter.join()
+        if exporter.exitcode != 0:
+            raise SystemExit(f"Exporting models to {directory} failed")
+        os.environ["PUMPKIN_SHARED_MODEL_DIR"] = directory
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if directory is not None and args.shared_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    serve()
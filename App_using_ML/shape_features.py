@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+from validation import ValidationResult
+
+# 6 trong 12 đặc trưng là hàm đóng của các số đo thô, nên client có thể chỉ gửi số đo thô
+# (?features=raw trên /predict_batch_columnar, payload còn một nửa) và server tự tính phần còn lại.
+# Extent (diện tích / khung bao) không tính được từ các cột khác nên vẫn là số đo thô.
+
+RAW_COLUMNS = ["Area", "Perimeter", "Major_Axis_Length", "Minor_Axis_Length", "Convex_Area", "Extent"]
+DERIVED_COLUMNS = ["Equiv_Diameter", "Eccentricity", "Solidity", "Roundness", "Aspect_Ration", "Compactness"]
+
+# Công thức của từng cột dẫn xuất (dùng trong thông báo lỗi)
+FORMULAS = {
+    "Equiv_Diameter": "sqrt(4 * Area / pi)",
+    "Eccentricity": "sqrt(1 - (Minor_Axis_Length / Major_Axis_Length)^2)",
+    "Solidity": "Area / Convex_Area",
+    "Roundness": "4 * pi * Area / Perimeter^2",
+    "Aspect_Ration": "Major_Axis_Length / Minor_Axis_Length",
+    "Compactness": "Equiv_Diameter / Major_Axis_Length",
+}
+
+# Sai số tương đối cho phép giữa giá trị client gửi và giá trị tính lại (0 = tắt kiểm tra).
+# Bộ dữ liệu làm tròn 4 chữ số thập phân, sai lệch do làm tròn nhỏ hơn 1e-4 tương đối.
+CONSISTENCY_RTOL = float(os.environ.get("PUMPKIN_CONSISTENCY_RTOL", "1e-3"))
+
+# Số hàng mỗi khối khi xử lý ma trận lớn (khối 8192 x 12 float64 = 768 KB, vừa cache L2)
+BLOCK_ROWS = 8192
+
+
+def derive(area, perimeter, major, minor, convex_area, out=None):
+    # Các cột dẫn xuất từ số đo thô (mảng 1 chiều liền bộ nhớ); số đo không hợp lệ cho NaN / inf,
+    # được validation.validate báo lỗi ở bước sau.
+    # out: {cột: mảng} để ghi kết quả vào chỗ có sẵn (ví dụ các hàng của ma trận kết quả), tránh mảng tạm.
+    if out is None:
+        out = {col: np.empty(len(area), dtype=np.float64) for col in DERIVED_COLUMNS}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        equiv_diameter = out["Equiv_Diameter"]
+        np.sqrt(np.multiply(area, 4 / np.pi, out=equiv_diameter), out=equiv_diameter)
+        eccentricity = np.divide(minor, major, out=out["Eccentricity"])
+        np.sqrt(np.subtract(1, np.square(eccentricity, out=eccentricity), out=eccentricity), out=eccentricity)
+        np.divide(area, convex_area, out=out["Solidity"])
+        roundness = np.square(perimeter, out=out["Roundness"])
+        np.multiply(np.divide(area, roundness, out=roundness), 4 * np.pi, out=roundness)
+        np.divide(major, minor, out=out["Aspect_Ration"])
+        np.divide(equiv_diameter, major, out=out["Compactness"])
+    return out
+
+
+def _formula_inputs(rows):
+    return [rows[col] for col in ("Area", "Perimeter", "Major_Axis_Length", "Minor_Axis_Length", "Convex_Area")]
+
+
+def expand(X_raw, columns):
+    # Ma trận (n, 6) theo thứ tự RAW_COLUMNS -> ma trận (n, 12) theo thứ tự columns.
+    # Kết quả được ghi theo cột (Fortran order) và các cột dẫn xuất được tính thẳng vào chỗ, theo từng khối
+    # BLOCK_ROWS hàng để các cột cách quãng của X_raw được đọc khi khối còn trong cache.
+    X_raw = np.asarray(X_raw, dtype=np.float64)
+    X = np.empty((len(columns), len(X_raw)), dtype=np.float64)
+    for start in range(0, len(X_raw), BLOCK_ROWS):
+        block = X_raw[start:start + BLOCK_ROWS]
+        rows = dict(zip(columns, X[:, start:start + len(block)]))
+        for k, col in enumerate(RAW_COLUMNS):
+            rows[col][:] = block[:, k]
+        derive(*_formula_inputs(rows), out=rows)
+    return X.T
+
+
+def _compare(X, columns, rtol):
+    # -> (supplied, computed, mismatch), mỗi mảng (6, n) theo thứ tự DERIVED_COLUMNS
+    needed = [col for col in columns if col != "Extent"]
+    rows = dict(zip(needed, np.ascontiguousarray(X[:, [columns.index(col) for col in needed]].T)))
+    supplied = np.stack([rows[col] for col in DERIVED_COLUMNS])
+    computed = np.empty_like(supplied)
+    derive(*_formula_inputs(rows), out=dict(zip(DERIVED_COLUMNS, computed)))
+    with np.errstate(invalid="ignore"):
+        mismatch = np.abs(supplied - computed) > rtol * np.abs(computed)
+    return supplied, computed, mismatch
+
+
+def check_consistency(X, columns, rtol=CONSISTENCY_RTOL):
+    # So các cột dẫn xuất client gửi với giá trị tính lại từ số đo thô; valid=False nghĩa là hàng lệch quá rtol.
+    # Chỉ đánh dấu, không loại hàng: hàng có giá trị không hữu hạn do validation.validate xử lý.
+    # Duyệt theo khối BLOCK_ROWS hàng (chép sang dạng theo cột cả ma trận lớn chậm hơn khoảng 3 lần);
+    # chi tiết chỉ được tính lại cho các hàng bị đánh dấu.
+    X = np.asarray(X, dtype=np.float64)
+    n_rows = len(X)
+    consistent = np.empty(n_rows, dtype=bool)
+    for start in range(0, n_rows, BLOCK_ROWS):
+        _, _, mismatch = _compare(X[start:start + BLOCK_ROWS], columns, rtol)
+        consistent[start:start + BLOCK_ROWS] = ~mismatch.any(axis=0)
+    if consistent.all():
+        return ValidationResult(n_rows, consistent, None, {})
+
+    flagged_rows = np.flatnonzero(~consistent)
+    supplied, computed, mismatch = _compare(X[flagged_rows], columns, rtol)
+    detail = np.full(len(flagged_rows), None, dtype=object)
+    by_column = {}
+    for j, col in enumerate(DERIVED_COLUMNS):
+        mask = mismatch[j]
+        if not mask.any():
+            continue
+        by_column[col] = int(np.count_nonzero(mask))
+        got = np.char.mod("%g", supplied[j, mask]).astype(str)
+        expected = np.char.mod("%.6g", computed[j, mask]).astype(str)
+        text = np.char.add(np.char.add(f"{col} differs from {FORMULAS[col]} (got ", got), ", computed ")
+        text = np.char.add(np.char.add(text, expected), ")").astype(object)
+        previous = detail[mask]
+        has_previous = previous != None  # noqa: E711 (so sánh từng phần tử của mảng object)
+        text[has_previous] = previous[has_previous] + "; " + text[has_previous]
+        detail[mask] = text
+    messages = np.full(n_rows, None, dtype=object)
+    messages[flagged_rows] = detail
+    return ValidationResult(n_rows, consistent, messages, by_column)
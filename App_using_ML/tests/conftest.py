@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Các module của app là file phẳng, import như khi chạy từ thư mục app (python main.py, uvicorn main:app);
+# synthetic.py (dữ liệu giả lập) nằm trong benchmarks/
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), os.path.join(HERE, "..", "..", "benchmarks")]
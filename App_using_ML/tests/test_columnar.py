@@ -0,0 +1,39 @@
+import json
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+from columnar import decode_columnar_json
+
+COLUMNS = ["Area", "Perimeter", "Extent"]
+
+
+def body(**overrides):
+    payload = {"Area": [1.0, 2.0], "Perimeter": [3.0, 4.0], "Extent": [0.5, 0.6]}
+    payload.update(overrides)
+    return json.dumps(payload).encode()
+
+
+def test_decode_columns_into_row_matrix():
+    X = decode_columnar_json(body(), COLUMNS)
+    assert X.shape == (2, 3)
+    assert np.array_equal(X[1], [2.0, 4.0, 0.6])
+
+
+@pytest.mark.parametrize("value", [5, [[1.0, 2.0]], [[1.0], [2.0]], [1.0, 2.0, 3.0], [[1.0], [2.0, 3.0]], "x"])
+def test_scalar_nested_and_ragged_columns_are_rejected_with_400(value):
+    # Cột đầu (số hàng lấy theo cột này) và một cột sau; số vô hướng cho mảng 0 chiều không có len()
+    for column in ("Area", "Extent"):
+        with pytest.raises(HTTPException) as e:
+            decode_columnar_json(body(**{column: value}), COLUMNS)
+        assert e.value.status_code == 400
+
+
+def test_endpoint_returns_400_for_scalar_column():
+    from fastapi.testclient import TestClient
+
+    import main
+    payload = {col: 5 for col in main.REQUIRED_COLUMNS}
+    response = TestClient(main.app).post("/predict_batch_columnar", json=payload)
+    assert response.status_code == 400
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+import synthetic
+from fast_pipeline import compile_pipeline
+from my_transformers import OutlierHandler, CorrelationDropper
+
+
+def make_pipeline(clf, feature_map=None):
+    return Pipeline([
+        ("outlier_remover", OutlierHandler(columns=synthetic.COLUMNS[:6])),
+        ("corr_dropper", CorrelationDropper(threshold=0.95)),
+        ("scaler", StandardScaler()),
+        *([("feature_map", feature_map)] if feature_map is not None else []),
+        ("clf", clf),
+    ])
+
+
+@pytest.fixture(scope="module")
+def svm_pipeline():
+    X, y = synthetic.generate(600, seed=1, outlier_rate=0.01)
+    return make_pipeline(SVC(kernel="rbf", class_weight="balanced", probability=True, random_state=0)).fit(X, y)
+
+
+@pytest.fixture(scope="module")
+def eval_rows():
+    # Có 1% outlier để kiểm tra cả bước thay outlier bằng median
+    return synthetic.generate(3000, seed=5, outlier_rate=0.01)[0]
+
+
+def assert_matches_sklearn(pipeline, X, atol):
+    compiled = compile_pipeline(pipeline, synthetic.COLUMNS)
+    expected_proba = pipeline.predict_proba(X)
+    ids, proba = compiled.predict_with_proba(X.to_numpy())
+    np.testing.assert_allclose(proba, expected_proba, rtol=0, atol=atol)
+    assert (ids == expected_proba.argmax(axis=1)).all()
+    np.testing.assert_allclose(compiled.predict_proba(X.to_numpy()), proba, rtol=0, atol=1e-15)
+    return compiled
+
+
+def test_compiled_lr_matches_sklearn(eval_rows):
+    X, y = synthetic.generate(2000, seed=4, outlier_rate=0.01)
+    pipeline = make_pipeline(LogisticRegression(class_weight="balanced", max_iter=1000)).fit(X, y)
+    compiled = assert_matches_sklearn(pipeline, eval_rows, atol=1e-13)
+    # Với LR, nhãn argmax trùng hẳn với Pipeline.predict
+    assert (compiled.predict(eval_rows.to_numpy()) == pipeline.predict(eval_rows)).all()
+
+
+def test_compiled_svm_matches_sklearn(svm_pipeline, eval_rows):
+    assert_matches_sklearn(svm_pipeline, eval_rows, atol=1e-12)
+
+
+def test_compiled_nystroem_matches_sklearn(eval_rows):
+    X, y = synthetic.generate(2000, seed=4, outlier_rate=0.01)
+    pipeline = make_pipeline(LogisticRegression(C=10.0, class_weight="balanced", max_iter=1000),
+                             Nystroem(kernel="rbf", gamma=0.1, n_components=50, random_state=42)).fit(X, y)
+    compiled = assert_matches_sklearn(pipeline, eval_rows, atol=1e-13)
+    assert (compiled.predict(eval_rows.to_numpy()) == pipeline.predict(eval_rows)).all()
+
+
+def test_svm_labels_agree_with_probabilities_on_boundary_rows(svm_pipeline):
+    compiled = compile_pipeline(svm_pipeline, synthetic.COLUMNS)
+    X = synthetic.generate(20000, seed=2, outlier_rate=0.01)[0].to_numpy()
+    # Các hàng sát biên quyết định: nơi dấu của decision function và argmax Platt có thể lệch nhau
+    boundary = np.argsort(np.abs(compiled.decision_function(X)))[:500]
+    ids, proba = compiled.predict_with_proba(X[boundary], block_rows=64)
+    assert (ids == proba.argmax(axis=1)).all()
+    assert (proba[np.arange(len(ids)), ids] >= 0.5).all()
+    assert (compiled.predict(X[boundary]) == compiled.classes_[ids]).all()
+    # Nhánh không chia khối cho cùng kết quả
+    ids_one_block, _ = compiled.predict_with_proba(X[boundary], block_rows=len(boundary))
+    assert (ids_one_block == ids).all()
@@ -0,0 +1,44 @@
+import threading
+import time
+
+from job_queue import JobStore
+
+
+def add_jobs(store, n):
+    for i in range(n):
+        store.add({"id": f"job-{i}", "status": "queued", "filename": "a.csv", "upload_path": "a.csv",
+                   "result_path": f"job-{i}.csv", "output_format": "csv", "chunk_rows": 10, "upload_bytes": 1,
+                   "created_at": time.time() + i})
+
+
+def test_claim_respects_running_limit_across_processes(tmp_path):
+    # Hai JobStore trên cùng một file DB, như hai process của serve.py --workers 2
+    path = str(tmp_path / "jobs.sqlite3")
+    first, second = JobStore(path), JobStore(path)
+    add_jobs(first, 4)
+
+    claimed = [first.claim_next(max_running=2), second.claim_next(max_running=2)]
+    assert [job["id"] for job in claimed] == ["job-0", "job-1"]
+    assert first.claim_next(max_running=2) is None
+    assert second.claim_next(max_running=2) is None
+
+    first.update("job-0", "running", status="done")
+    assert second.claim_next(max_running=2)["id"] == "job-2"
+    assert first.count("running") == 2
+
+
+def test_concurrent_claims_never_exceed_limit(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    add_jobs(JobStore(path), 8)
+    results = []
+
+    def claim():
+        results.append(JobStore(path).claim_next(max_running=3))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(job is not None for job in results) == 3
+    assert JobStore(path).count("running") == 3
@@ -0,0 +1,22 @@
+import re
+
+from fastapi.testclient import TestClient
+
+import main
+import synthetic
+
+
+def stage_counts(text, endpoint):
+    pattern = rf'pumpkin_stage_seconds_count{{endpoint="{re.escape(endpoint)}",stage="([a-z_]+)"}} (\d+)'
+    return {stage: int(count) for stage, count in re.findall(pattern, text)}
+
+
+def test_records_endpoint_times_parsing_and_validation_separately():
+    X, _ = synthetic.generate(20, seed=3)
+    client = TestClient(main.app)
+    before = stage_counts(client.get("/metrics").text, "/predict_batch")
+    assert client.post("/predict_batch", json=X.to_dict(orient="records")).status_code == 200
+    after = stage_counts(client.get("/metrics").text, "/predict_batch")
+    for stage in ("read_body", "parse", "schema_validate", "build_matrix"):
+        assert after[stage] == before.get(stage, 0) + 1
+    assert "parse_validate" not in after
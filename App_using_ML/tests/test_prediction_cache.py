@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+def double_first_column(X):
+    return X[:, :1] * 2
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_repeated_batch_is_served_from_cache():
+    cache = PredictionCache(max_entries=100)
+    X = np.random.default_rng(0).random((50, 12))
+    first = cache.predict(X, "m", double_first_column)
+    second = cache.predict(X, "m", lambda X_miss: pytest.fail("model called on a cached batch"))
+    assert np.array_equal(first, second)
+    assert cache.stats()["hits"] == 50
+
+
+def test_restoring_expired_keys_under_eviction_keeps_every_key_indexed(clock):
+    cache = PredictionCache(max_entries=8, ttl_seconds=10)
+    A = np.arange(16, dtype=np.float64).reshape(8, 2)
+    cache.predict(A, "m", double_first_column)
+    clock[0] = 20
+    cache.predict(A[:4], "m", double_first_column)
+    # 4 khóa đã hết hạn (vẫn giữ slot) + 4 khóa mới: cache đầy nên phải loại bớt trong lúc ghi
+    B = np.vstack([A[4:], A[4:] + 100])
+    cache.predict(B, "m", double_first_column)
+
+    hits_before = cache.hits
+    assert np.array_equal(cache.predict(B, "m", double_first_column), double_first_column(B))
+    assert cache.hits - hits_before == len(B)
+    assert len(np.unique(cache._index_slots)) == len(cache._index_slots)
+
+
+def test_invalidate_drops_results_and_namespaces_of_the_model():
+    cache = PredictionCache(max_entries=100)
+    X = np.random.default_rng(1).random((10, 12))
+    for namespace in [("m", 1), ("m", 2), ("other", 1)]:
+        cache.predict(X, namespace, double_first_column)
+    cache.invalidate("m")
+    assert list(cache._namespaces) == [("other", 1)]
+    assert cache.stats()["size"] == 10
+
+    # Version mới nhận id mới, không trùng các kết quả còn lại
+    misses_before = cache.misses
+    assert np.array_equal(cache.predict(X, ("m", 3), double_first_column), double_first_column(X))
+    assert cache.misses - misses_before == len(X)
+    assert len(set(cache._namespaces.values())) == len(cache._namespaces)
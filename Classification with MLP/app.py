@@ -1,13 +1,23 @@
 import streamlit as st
-import requests
 import pandas as pd
+import numpy as np
+
+from batch_client import BatchClient, ChunkError
 
 st.set_page_config(page_title="Pumpkin Seed Classifier", page_icon="🎃", layout="wide")
 
 st.title("🎃 Hệ thống Dự đoán Hạt Bí ngô hàng loạt")
 st.info("Hệ thống sử dụng toàn bộ 12 đặc trưng hình thái để dự đoán.")
 
-API_URL_FILE = "http://localhost:8000/predict_file"
+# File được gửi theo từng chunk song song (định dạng nhị phân theo cột), kết quả hiển thị dần
+API_URL_BATCH = "http://localhost:8000/predict_batch_columnar"
+CHUNK_ROWS = 5000
+MAX_WORKERS = 4
+PREVIEW_ROWS = 1000
+
+FEATURE_COLS = ['Area', 'Perimeter', 'Major_Axis_Length', 'Minor_Axis_Length',
+                'Convex_Area', 'Equiv_Diameter', 'Eccentricity', 'Solidity',
+                'Extent', 'Roundness', 'Aspect_Ration', 'Compactness']
 
 uploaded_file = st.file_uploader("Tải lên file dữ liệu (.csv, .xlsx)", type=["csv", "xlsx", "xls"])
 
@@ -21,24 +31,45 @@ if uploaded_file is not None:
         st.write("🔍 **Xem trước dữ liệu:**")
         st.dataframe(preview_df.head(), use_container_width=True)
         
-        if st.button("🚀 Dự đoán hàng loạt"):
-            uploaded_file.seek(0)
-            files = {"file": (uploaded_file.name, uploaded_file.getvalue(), "application/octet-stream")}
-            
-            with st.spinner('Đang xử lý...'):
-                try:
-                    response = requests.post(API_URL_FILE, files=files)
-                    if response.status_code == 200:
-                        results_df = pd.DataFrame(response.json())
-                        st.success("✅ Thành công!")
-                        
-                        st.dataframe(results_df, use_container_width=True)
-                        
-                        csv_data = results_df.to_csv(index=False).encode('utf-8')
-                        st.download_button("📥 Tải về CSV", data=csv_data, file_name="predictions.csv", mime="text/csv")
-                    else:
-                        st.error(f"Lỗi: {response.text}")
-                except Exception as e:
-                    st.error(f"Không kết nối được server: {e}")
+        missing_cols = [c for c in FEATURE_COLS if c not in preview_df.columns]
+        if missing_cols:
+            st.error(f"File thiếu các cột: {missing_cols}")
+        elif st.button("🚀 Dự đoán hàng loạt"):
+            n_rows = len(preview_df)
+            predictions = np.full(n_rows, None, dtype=object)
+            confidences = np.full(n_rows, None, dtype=object)
+            done = np.zeros(n_rows, dtype=bool)
+            invalid = np.zeros(n_rows, dtype=bool)
+            progress = st.progress(0.0, text="Đang xử lý...")
+            table = st.empty()
+            try:
+                with BatchClient(API_URL_BATCH, FEATURE_COLS, CHUNK_ROWS, MAX_WORKERS) as client:
+                    for result in client.predict(preview_df):
+                        rows = slice(result.start, result.stop)
+                        predictions[rows] = result.predictions
+                        # Hàng server đánh dấu không hợp lệ (thiếu giá trị / ngoài miền) không có dự đoán
+                        confidences[rows] = np.where(result.valid, np.char.mod("%.2f%%", result.probabilities * 100), None)
+                        invalid[rows] = ~result.valid
+                        done[rows] = True
+                        n_done = int(done.sum())
+                        progress.progress(n_done / n_rows, text=f"Đã dự đoán {n_done}/{n_rows} dòng")
+                        # Chỉ vẽ lại tối đa PREVIEW_ROWS dòng đã xong để giao diện không chậm với file lớn
+                        preview = np.flatnonzero(done)[:PREVIEW_ROWS]
+                        table.dataframe(preview_df.iloc[preview].assign(Prediction=predictions[preview],
+                                                                        Confidence=confidences[preview]),
+                                        use_container_width=True)
+
+                results_df = preview_df.assign(Prediction=predictions, Confidence=confidences)
+                st.success("✅ Thành công!")
+                if invalid.any():
+                    st.warning(f"{int(invalid.sum())} dòng không hợp lệ (thiếu giá trị hoặc ngoài miền cho phép) nên không được dự đoán.")
+
+                table.dataframe(results_df, use_container_width=True)
+
+                csv_data = results_df.to_csv(index=False).encode('utf-8')
+                st.download_button("📥 Tải về CSV", data=csv_data, file_name="predictions.csv", mime="text/csv")
+            except ChunkError as e:
+                # Các dòng đã dự đoán xong vẫn được giữ trên bảng
+                st.error(f"Lỗi khi gửi dữ liệu tới server: {e}")
     except Exception as e:
         st.error(f"Lỗi file: {e}")
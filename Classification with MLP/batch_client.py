@@ -0,0 +1,114 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+# Client gửi DataFrame lớn lên /predict_batch_columnar theo từng chunk:
+#   - mỗi chunk mã hóa nhị phân (float64 little-endian, n x 12 theo thứ tự cột), nhỏ hơn JSON theo hàng nhiều lần;
+#   - các chunk được gửi song song qua một Session giữ kết nối (keep-alive, pool đủ cho số luồng);
+#   - chunk lỗi (mất kết nối, timeout, 5xx) được gửi lại riêng, không phải gửi lại cả file;
+#   - kết quả trả về theo từng chunk ngay khi xong để giao diện hiển thị dần.
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+FLOAT_DTYPE = np.dtype("<f8")
+DEFAULT_CHUNK_ROWS = 5000
+
+# class_id trong kết quả nhị phân -> tên lớp (cùng thứ tự classes_ của các model)
+CLASSES = np.array(["Çerçevelik", "Ürgüp Sivrisi"], dtype=object)
+
+# Mã lỗi HTTP nên thử lại (server quá tải / tạm thời lỗi); lỗi 4xx khác là do dữ liệu nên không thử lại
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class ChunkError(Exception):
+    def __init__(self, index, start, stop, message):
+        super().__init__(f"Chunk {index} (rows {start}-{stop - 1}) failed: {message}")
+        self.index = index
+        self.start = start
+        self.stop = stop
+
+
+class ChunkResult:
+    def __init__(self, index, start, stop, class_ids, probabilities, attempts):
+        self.index = index
+        self.start = start
+        self.stop = stop
+        self.class_ids = class_ids
+        self.probabilities = probabilities
+        self.attempts = attempts
+
+    @property
+    def valid(self):
+        # Hàng bị server đánh dấu không hợp lệ có class_id -1 (xác suất NaN)
+        return self.class_ids >= 0
+
+    @property
+    def predictions(self):
+        return np.where(self.valid, CLASSES[np.maximum(self.class_ids, 0)], None)
+
+
+class BatchClient:
+    def __init__(self, url, columns, chunk_rows=DEFAULT_CHUNK_ROWS, max_workers=4,
+                 max_retries=3, backoff_seconds=0.5, timeout=60):
+        self.url = url
+        self.columns = list(columns)
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _post_chunk(self, index, start, stop, body):
+        # Gửi một chunk, thử lại với thời gian chờ tăng dần (0.5s, 1s, 2s...) khi lỗi tạm thời
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.post(self.url, data=body, timeout=self.timeout,
+                                             headers={"content-type": BINARY_MEDIA_TYPE})
+                if response.status_code == 200:
+                    out = np.frombuffer(response.content, dtype=FLOAT_DTYPE).reshape(-1, 2)
+                    if len(out) != stop - start:
+                        raise ChunkError(index, start, stop, f"expected {stop - start} results, got {len(out)}")
+                    return ChunkResult(index, start, stop, out[:, 0].astype(np.int64), out[:, 1], attempt)
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUS:
+                    raise ChunkError(index, start, stop, error)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = str(e)
+            if attempt > self.max_retries:
+                raise ChunkError(index, start, stop, f"{error} (after {attempt} attempts)")
+            time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+    def predict(self, df):
+        # Sinh ChunkResult theo thứ tự hoàn thành (không phải thứ tự chunk); dùng start/stop để ghép kết quả
+        # Ô không phải số được gửi dưới dạng NaN để server báo lỗi theo hàng thay vì hỏng cả file
+        X = np.ascontiguousarray(df[self.columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=FLOAT_DTYPE))
+        bounds = [(i, start, min(start + self.chunk_rows, len(X)))
+                  for i, start in enumerate(range(0, len(X), self.chunk_rows))]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._post_chunk, i, start, stop, X[start:stop].tobytes())
+                       for i, start, stop in bounds]
+            try:
+                for future in as_completed(futures):
+                    yield future.result()
+            finally:
+                # Dừng các chunk chưa gửi nếu người gọi ngừng đọc hoặc có chunk lỗi hẳn
+                for future in futures:
+                    future.cancel()
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import tensorflow as tf
+
+# Dự đoán Keras với một tập nhỏ kích thước batch cố định ("bucket"):
+#   - mỗi batch được chia / đệm thêm hàng 0 cho vừa một bucket, nên model chỉ thấy vài shape cố định;
+#   - mỗi bucket có một hàm suy luận đã trace sẵn (tf.function cụ thể cho shape [bucket, n_features]),
+#     không còn retrace khi gặp kích thước batch mới như model.predict;
+#   - warmup() trace và chạy thử mọi bucket một lần, để request đầu tiên không phải trả chi phí đó.
+# Thống kê theo bucket: số lần gọi, số hàng thật / hàng đệm (tỉ lệ lãng phí) và độ trễ p50 / p99.
+
+DEFAULT_BUCKETS = (1, 8, 64, 512, 4096)
+
+
+class BucketedPredictor:
+    def __init__(self, model, n_features, buckets=DEFAULT_BUCKETS, stats_window=10000):
+        self.buckets = sorted({int(b) for b in buckets})
+        if not self.buckets or self.buckets[0] <= 0:
+            raise ValueError(f"Bucket sizes must be positive, got {list(buckets)}")
+        self.n_features = n_features
+        self._infer = tf.function(lambda x: model(x, training=False))
+        self._functions = {}
+        self._trace_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.ready = False
+        self.warmup_seconds = None
+        self._calls = {b: 0 for b in self.buckets}
+        self._rows = {b: 0 for b in self.buckets}
+        self._padded = {b: 0 for b in self.buckets}
+        self._latencies = {b: deque(maxlen=stats_window) for b in self.buckets}
+
+    def _function(self, bucket):
+        fn = self._functions.get(bucket)
+        if fn is None:
+            with self._trace_lock:
+                fn = self._functions.get(bucket)
+                if fn is None:
+                    fn = self._infer.get_concrete_function(tf.TensorSpec([bucket, self.n_features], tf.float32))
+                    self._functions[bucket] = fn
+        return fn
+
+    def warmup(self):
+        # Trace + chạy thử từng bucket; request đến trong lúc này vẫn được phục vụ (trace ngay khi cần)
+        start = time.perf_counter()
+        for bucket in self.buckets:
+            self._function(bucket)(tf.zeros([bucket, self.n_features], tf.float32))
+        self.warmup_seconds = time.perf_counter() - start
+        self.ready = True
+
+    def bucket_for(self, n_rows):
+        # Bucket nhỏ nhất chứa được n_rows hàng (batch lớn hơn bucket lớn nhất được chia trước trong predict)
+        for bucket in self.buckets:
+            if bucket >= n_rows:
+                return bucket
+        return self.buckets[-1]
+
+    def _run(self, X, bucket):
+        n_rows = len(X)
+        start = time.perf_counter()
+        if n_rows < bucket:
+            X = np.concatenate([X, np.zeros((bucket - n_rows, self.n_features), dtype=np.float32)])
+        out = self._function(bucket)(tf.constant(X)).numpy()[:n_rows]
+        elapsed = time.perf_counter() - start
+        with self._stats_lock:
+            self._calls[bucket] += 1
+            self._rows[bucket] += n_rows
+            self._padded[bucket] += bucket - n_rows
+            self._latencies[bucket].append(elapsed)
+        return out
+
+    def predict(self, X):
+        # Ma trận (n, n_features) đã scale -> đầu ra model (n, 1), giống model.predict
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        largest = self.buckets[-1]
+        outputs = []
+        for start in range(0, len(X), largest):
+            chunk = X[start:start + largest]
+            outputs.append(self._run(chunk, self.bucket_for(len(chunk))))
+        if not outputs:
+            return np.empty((0, 1), dtype=np.float64)
+        return np.concatenate(outputs).astype(np.float64)
+
+    def stats(self):
+        with self._stats_lock:
+            buckets = {}
+            for bucket in self.buckets:
+                latencies = np.array(self._latencies[bucket]) * 1000
+                total = self._rows[bucket] + self._padded[bucket]
+                buckets[str(bucket)] = {
+                    "calls": self._calls[bucket],
+                    "rows": self._rows[bucket],
+                    "padded_rows": self._padded[bucket],
+                    "padding_waste": round(self._padded[bucket] / total, 4) if total else 0.0,
+                    "p50_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+                    "p99_ms": round(float(np.percentile(latencies, 99)), 3) if len(latencies) else None,
+                }
+        return {
+            "ready": self.ready,
+            "warmup_seconds": round(self.warmup_seconds, 3) if self.warmup_seconds is not None else None,
+            "buckets": buckets,
+        }
@@ -0,0 +1,64 @@
+import json
+from typing import List
+
+import numpy as np
+from fastapi import HTTPException
+
+# Định dạng nhị phân: ma trận float64 little-endian, lưu theo hàng (row-major),
+# mỗi hàng gồm đúng 12 giá trị theo thứ tự REQUIRED_COLUMNS
+BINARY_MEDIA_TYPE = "application/octet-stream"
+FLOAT_DTYPE = np.dtype("<f8")
+
+
+def decode_columnar_json(body: bytes, columns: List[str]) -> np.ndarray:
+    # Body dạng {"Area": [...], "Perimeter": [...], ...} -> ma trận (n, 12)
+    try:
+        payload = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Columnar JSON must be an object of column arrays")
+
+    missing_cols = [col for col in columns if col not in payload]
+    if missing_cols:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
+
+    try:
+        arrays = [np.asarray(payload[col], dtype=np.float64) for col in columns]
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Columns must contain only numbers: {e}")
+
+    # Kiểm tra ndim trước: giá trị vô hướng cho mảng 0 chiều, len() sẽ lỗi
+    if any(arr.ndim != 1 for arr in arrays) or any(len(arr) != len(arrays[0]) for arr in arrays):
+        raise HTTPException(status_code=400, detail="All columns must be flat arrays of the same length")
+
+    # Ghi thẳng từng cột vào ma trận kết quả, không tạo object trung gian theo hàng
+    X = np.empty((len(arrays[0]), len(columns)), dtype=np.float64)
+    for j, arr in enumerate(arrays):
+        X[:, j] = arr
+    return X
+
+
+def decode_binary(body: bytes, n_features: int) -> np.ndarray:
+    # Body là buffer float64 thô -> ma trận (n, n_features), không sao chép dữ liệu
+    row_bytes = n_features * FLOAT_DTYPE.itemsize
+    if len(body) % row_bytes != 0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Binary payload size must be a multiple of {row_bytes} bytes ({n_features} float64 per row)",
+        )
+    return np.frombuffer(body, dtype=FLOAT_DTYPE).reshape(-1, n_features)
+
+
+def encode_binary(class_ids: np.ndarray, probabilities: np.ndarray) -> bytes:
+    # Kết quả nhị phân: ma trận float64 (n, 2) gồm [class_id, xác suất] cho mỗi hàng
+    out = np.empty((len(class_ids), 2), dtype=FLOAT_DTYPE)
+    out[:, 0] = class_ids
+    out[:, 1] = probabilities
+    return out.tobytes()
+
+
+def decode_binary_result(body: bytes):
+    # Hàm phía client: giải mã kết quả nhị phân thành (class_ids, probabilities)
+    out = np.frombuffer(body, dtype=FLOAT_DTYPE).reshape(-1, 2)
+    return out[:, 0].astype(np.int64), out[:, 1]
@@ -1,21 +1,56 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
 import joblib
-import tensorflow as tf
 import io
 import os
+import threading
+
+import metrics
+import shape_features
+import validation
+from columnar import BINARY_MEDIA_TYPE, decode_binary, decode_columnar_json, encode_binary
+from dataset_cache import open_dataset
+from micro_batching import MicroBatcher
+from prediction_cache import PredictionCache
+from numpy_mlp import NumpyMLP, WEIGHTS_PATH
+from streaming import DEFAULT_CHUNK_ROWS, MEDIA_TYPES, iter_upload_chunks, peek_first_chunk, stream_results
 
 app = FastAPI(title="Pumpkin Seed Classification API")
+# Đo thời gian từng giai đoạn, xuất ra /metrics (định dạng Prometheus)
+metrics.install(app)
 
 # --- LOAD ASSETS ---
 model = None
 scaler = None
 
+# "keras" (mặc định), "numpy": engine NumPy thuần, không import tensorflow,
+# hoặc "bucketed": Keras với các hàm suy luận đã trace sẵn cho một số kích thước batch cố định (bucketed_predictor.py)
+BACKEND = os.environ.get("PUMPKIN_BACKEND", "keras")
+# Chế độ nhiều worker (serve.py): trọng số đã được master export, các worker mmap chung một bản
+SHARED_MODEL_DIR = os.environ.get("PUMPKIN_SHARED_MODEL_DIR")
+
 # Kiểm tra sự tồn tại của file trước khi load
-if os.path.exists('pumpkin_model.keras') and os.path.exists('scaler.joblib'):
+if BACKEND == "numpy" and SHARED_MODEL_DIR:
+    model = NumpyMLP.load_shared(SHARED_MODEL_DIR)
+    print(f"NumPy model attached from {SHARED_MODEL_DIR}")
+elif BACKEND == "numpy":
+    # Scaler đã được gộp vào lớp Dense đầu tiên của file .npz
+    if os.path.exists(WEIGHTS_PATH):
+        try:
+            model = NumpyMLP.load(WEIGHTS_PATH)
+            print("NumPy model loaded successfully!")
+        except Exception as e:
+            print(f"Error loading assets: {e}")
+    else:
+        print(f"CRITICAL ERROR: File '{WEIGHTS_PATH}' not found! Run 'python numpy_mlp.py export' first.")
+elif os.path.exists('pumpkin_model.keras') and os.path.exists('scaler.joblib'):
     try:
+        import tensorflow as tf
         model = tf.keras.models.load_model('pumpkin_model.keras')
         scaler = joblib.load('scaler.joblib')
         print("Model and Scaler loaded successfully!")
@@ -24,7 +59,39 @@ if os.path.exists('pumpkin_model.keras') and os.path.exists('scaler.joblib'):
 else:
     print("CRITICAL ERROR: File 'pumpkin_model.keras' or 'scaler.joblib' not found!")
 
+# Danh sách 12 cột đặc trưng chuẩn
+FEATURE_COLS = ['Area', 'Perimeter', 'Major_Axis_Length', 'Minor_Axis_Length',
+                'Convex_Area', 'Equiv_Diameter', 'Eccentricity', 'Solidity',
+                'Extent', 'Roundness', 'Aspect_Ration', 'Compactness']
+
+# Chế độ "bucketed": các bucket được warm-up ở luồng nền, /ready trả 503 cho tới khi xong
+BUCKETS = [int(b) for b in os.environ.get("PUMPKIN_BUCKETS", "1,8,64,512,4096").split(",")]
+bucketed = None
+if BACKEND == "bucketed" and model is not None:
+    from bucketed_predictor import BucketedPredictor
+    bucketed = BucketedPredictor(model, len(FEATURE_COLS), BUCKETS)
+    threading.Thread(target=bucketed.warmup, name="bucket-warmup", daemon=True).start()
+
+# Cấu hình micro-batching cho /predict (có thể đổi qua biến môi trường)
+MAX_BATCH_SIZE = int(os.environ.get("PUMPKIN_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.environ.get("PUMPKIN_MAX_WAIT_MS", "5"))
+
+# Cache kết quả dự đoán, tắt mặc định (PUMPKIN_CACHE_SIZE=số hàng để bật): chỉ có lợi khi model chậm hơn
+# việc tra cache (SVM, MLP Keras), với LR đã biên dịch tra cache chậm hơn tính lại
+CACHE_SIZE = int(os.environ.get("PUMPKIN_CACHE_SIZE", "0"))
+CACHE_TTL_SECONDS = float(os.environ.get("PUMPKIN_CACHE_TTL", "3600"))
+CACHE_DECIMALS = int(os.environ.get("PUMPKIN_CACHE_DECIMALS", "4"))
+
+# Thư mục chứa các file dữ liệu tham chiếu lớn (Excel/CSV) chấm điểm trực tiếp trên server qua /predict_reference
+REFERENCE_DIR = os.environ.get("PUMPKIN_REFERENCE_DIR", "reference_data")
+
+# Định danh artifact đang phục vụ: cache tự vô hiệu khi file model thay đổi
+MODEL_PATH = WEIGHTS_PATH if BACKEND == "numpy" else 'pumpkin_model.keras'
+MODEL_ID = (BACKEND, os.path.getmtime(MODEL_PATH) if os.path.exists(MODEL_PATH) else None)
+prediction_cache = PredictionCache(CACHE_SIZE, CACHE_TTL_SECONDS, CACHE_DECIMALS)
+
 class SeedData(BaseModel):
+    # Miền giá trị được kiểm tra bởi validation.py (cùng quy tắc cho /predict và các endpoint theo batch)
     Area: float
     Perimeter: float
     Major_Axis_Length: float
@@ -47,16 +114,38 @@ def preprocess_input(df: pd.DataFrame):
     scaled_data = scaler.transform(df)
     return scaled_data
 
+def predict_rows(X: np.ndarray, endpoint: str = ""):
+    # Dự đoán cho ma trận (n, 12) -> xác suất lớp 1 của từng hàng, chỉ tính các hàng chưa có trong cache
+    with metrics.stage(endpoint, "predict"):
+        return prediction_cache.predict(X, MODEL_ID, lambda X_miss: predict_rows_uncached(X_miss, endpoint))
+
+def predict_rows_uncached(X: np.ndarray, endpoint: str = ""):
+    if BACKEND == "numpy":
+        # Scaler đã được gộp vào lớp Dense đầu tiên nên không có giai đoạn scaling riêng
+        with metrics.stage(endpoint, "model"):
+            return model.predict(X)[:, 0]
+    with metrics.stage(endpoint, "scaling"):
+        processed_data = preprocess_input(pd.DataFrame(X, columns=FEATURE_COLS))
+    with metrics.stage(endpoint, "model"):
+        if bucketed is not None:
+            return bucketed.predict(processed_data)[:, 0]
+        return model.predict(processed_data, verbose=0)[:, 0]
+
+# Gom các request /predict đồng thời thành một lần gọi model.predict
+batcher = MicroBatcher(lambda X: predict_rows(X, "/predict"), max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+
 @app.post("/predict")
-async def predict(data: SeedData):
+async def predict(request: Request, data: SeedData):
+    metrics.observe_parse(request)
     if model is None:
         raise HTTPException(status_code=500, detail="Model is not initialized.")
+    row = [getattr(data, col) for col in FEATURE_COLS]
+    check = validation.validate(np.array([row]), FEATURE_COLS)
+    if not check.all_valid:
+        raise HTTPException(status_code=422, detail=check.report())
     try:
-        input_df = pd.DataFrame([data.model_dump()])
-        processed_data = preprocess_input(input_df)
-        prediction = model.predict(processed_data)
-        
-        prob_class_1 = float(prediction[0][0])
+        with metrics.stage(metrics.endpoint_label(request), "queue_and_batch"):
+            prob_class_1 = float(await batcher.submit(row))
         class_name = "Urgup Sivrisi" if prob_class_1 > 0.5 else "Cercevelik"
         confidence = prob_class_1 if prob_class_1 > 0.5 else 1 - prob_class_1
         
@@ -68,48 +157,215 @@ async def predict(data: SeedData):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def predict_valid_rows(X: np.ndarray, check, endpoint: str = ""):
+    # Xác suất lớp 1 cho các hàng hợp lệ; hàng không hợp lệ không đưa vào model và có xác suất NaN
+    if check.all_valid:
+        return predict_rows(X, endpoint)
+    probs = np.full(len(X), np.nan)
+    if check.valid.any():
+        probs[check.valid] = predict_rows(X[check.valid], endpoint)
+    return probs
+
+def label_chunk(df: pd.DataFrame, endpoint: str = "/predict_file"):
+    # Thêm cột Prediction / Confidence / Error cho một DataFrame (vector hóa, không lặp theo hàng).
+    # Cột Error luôn có mặt để các chunk của một stream CSV có cùng header.
+    metrics.REQUEST_ROWS.observe(len(df), endpoint)
+    with metrics.stage(endpoint, "build_matrix"):
+        X = validation.to_matrix(df, FEATURE_COLS)
+    with metrics.stage(endpoint, "validate"):
+        check = validation.validate(X, FEATURE_COLS)
+    probs = predict_valid_rows(X, check, endpoint)
+    with metrics.stage(endpoint, "format_labels"):
+        is_class_1 = probs > 0.5
+        prediction = np.where(is_class_1, "Urgup Sivrisi", "Cercevelik").astype(object)
+        confidence = np.char.mod("%.2f%%", np.where(is_class_1, probs, 1 - probs) * 100).astype(object)
+        if not check.all_valid:
+            prediction[~check.valid] = None
+            confidence[~check.valid] = None
+        df['Prediction'] = prediction
+        df['Confidence'] = confidence
+        df['Error'] = check.messages
+    return df
+
 @app.post("/predict_file")
-async def predict_file(file: UploadFile = File(...)):
+async def predict_file(request: Request, file: UploadFile = File(...), stream: bool = False,
+                       output_format: str = "ndjson", chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    metrics.observe_parse(request)
+    endpoint = metrics.endpoint_label(request)
     if model is None:
         raise HTTPException(status_code=500, detail="Model is not initialized.")
-    try:
-        contents = await file.read()
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        # Danh sách 12 cột đặc trưng chuẩn
-        feature_cols = ['Area', 'Perimeter', 'Major_Axis_Length', 'Minor_Axis_Length', 
-                        'Convex_Area', 'Equiv_Diameter', 'Eccentricity', 'Solidity', 
-                        'Extent', 'Roundness', 'Aspect_Ration', 'Compactness']
-        
-        # Kiểm tra xem file upload có đủ cột không
-        missing_cols = [c for c in feature_cols if c not in df.columns]
+    if stream:
+        # Chế độ streaming: đọc, dự đoán và trả kết quả theo từng chunk (NDJSON hoặc CSV)
+        if output_format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"output_format must be one of {list(MEDIA_TYPES)}")
+        if chunk_rows <= 0:
+            raise HTTPException(status_code=400, detail="chunk_rows must be positive")
+        # Parse chunk đầu trong threadpool: chunk lớn không được chặn event loop (và các request /predict khác)
+        upload_chunks = iter_upload_chunks(file.file, file.filename, chunk_rows)
+        try:
+            first, chunks = await run_in_threadpool(peek_first_chunk, upload_chunks)
+        except (pd.errors.EmptyDataError, pd.errors.ParserError) as e:
+            raise HTTPException(status_code=400, detail=f"Cannot parse file: {e}")
+        missing_cols = [c for c in FEATURE_COLS if first is None or c not in first.columns]
         if missing_cols:
+            upload_chunks.close()  # đóng reader trước khi file upload bị đóng
             raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
+        return StreamingResponse(stream_results(chunks, label_chunk, output_format),
+                                 media_type=MEDIA_TYPES[output_format])
+    try:
+        with metrics.maybe_profile(request) as profile:
+            with metrics.stage(endpoint, "read_upload"):
+                contents = await file.read()
+            with metrics.stage(endpoint, "parse_file"):
+                if file.filename.endswith('.csv'):
+                    df = pd.read_csv(io.BytesIO(contents))
+                else:
+                    df = pd.read_excel(io.BytesIO(contents))
+            
+            # Kiểm tra xem file upload có đủ cột không
+            missing_cols = [c for c in FEATURE_COLS if c not in df.columns]
+            if missing_cols:
+                raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
 
-        input_data = df[feature_cols]
-        processed_data = preprocess_input(input_data)
-        predictions = model.predict(processed_data)
-        
-        results = []
-        confidences = []
-        for p in predictions:
-            prob_val = float(p[0])
-            if prob_val > 0.5:
-                results.append("Urgup Sivrisi")
-                confidences.append(f"{prob_val * 100:.2f}%")
-            else:
-                results.append("Cercevelik")
-                confidences.append(f"{(1 - prob_val) * 100:.2f}%")
-        
-        df['Prediction'] = results
-        df['Confidence'] = confidences
-        return df.to_dict(orient='records')
+            df = label_chunk(df, endpoint)
+            with metrics.stage(endpoint, "serialize"):
+                response = JSONResponse(df.to_dict(orient='records'))
+        if profile["profile"] is not None:
+            response.headers["X-Profile-Report"] = profile["profile"]
+        return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def resolve_reference(name: str):
+    # Chỉ cho phép file nằm trong REFERENCE_DIR (chặn "../")
+    root = os.path.realpath(REFERENCE_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise HTTPException(status_code=400, detail="Invalid reference file name.")
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Reference file '{name}' not found.")
+    return path
+
+@app.post("/predict_reference")
+def predict_reference(request: Request, name: str, stream: bool = False,
+                      output_format: str = "ndjson", chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    # Giống /predict_file nhưng đọc file có sẵn trên server qua cache cột (dataset_cache.py):
+    # chỉ lần đầu (hoặc khi file đổi) mới phải parse Excel/CSV, các lần sau mở bằng mmap
+    metrics.observe_parse(request)
+    endpoint = metrics.endpoint_label(request)
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model is not initialized.")
+    if output_format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"output_format must be one of {list(MEDIA_TYPES)}")
+    if chunk_rows <= 0:
+        raise HTTPException(status_code=400, detail="chunk_rows must be positive")
+    path = resolve_reference(name)
+    try:
+        with metrics.stage(endpoint, "open_dataset"):
+            dataset = open_dataset(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    missing_cols = [c for c in FEATURE_COLS if c not in dataset.columns]
+    if missing_cols:
+        raise HTTPException(status_code=400, detail=f"Missing columns: {missing_cols}")
+    if stream:
+        chunks = dataset.iter_frames(chunk_rows)
+        return StreamingResponse(stream_results(chunks, lambda df: label_chunk(df, endpoint), output_format),
+                                 media_type=MEDIA_TYPES[output_format])
+    df = label_chunk(dataset.frame(), endpoint)
+    with metrics.stage(endpoint, "serialize"):
+        return JSONResponse(df.to_dict(orient='records'))
+
+# Tên lớp theo class_id (train_MLP.py mã hóa Çerçevelik -> 0, Ürgüp Sivrisi -> 1)
+CLASS_NAMES = np.array(["Çerçevelik", "Ürgüp Sivrisi"], dtype=object)
+
+def score_columnar(request: Request, X: np.ndarray, is_binary: bool, raw_features: bool = False):
+    # Chạy trong threadpool: (tính đặc trưng dẫn xuất) + kiểm tra + dự đoán + tạo response cho /predict_batch_columnar
+    endpoint = metrics.endpoint_label(request)
+    consistency = None
+    if raw_features:
+        with metrics.stage(endpoint, "derive_features"):
+            X = shape_features.expand(X, FEATURE_COLS)
+    with metrics.stage(endpoint, "validate"):
+        check = validation.validate(X, FEATURE_COLS)
+        if not raw_features and shape_features.CONSISTENCY_RTOL > 0:
+            consistency = shape_features.check_consistency(X, FEATURE_COLS)
+    probs = predict_valid_rows(X, check, endpoint)
+    with metrics.stage(endpoint, "serialize"):
+        # Hàng không hợp lệ: class_id -1, xác suất NaN (giống App_using_ML)
+        class_ids = np.where(check.valid, probs > 0.5, -1).astype(np.int64)
+        confidence = np.where(class_ids == 1, probs, 1 - probs)
+        if is_binary:
+            response = Response(content=encode_binary(class_ids, confidence), media_type=BINARY_MEDIA_TYPE)
+            response.headers["X-Invalid-Rows"] = str(check.n_invalid)
+            if consistency is not None:
+                response.headers["X-Inconsistent-Rows"] = str(consistency.n_invalid)
+            return response
+        predictions = CLASS_NAMES[np.maximum(class_ids, 0)]
+        predictions[class_ids < 0] = None
+        content = {
+            "model": "pumpkin_model",
+            "predictions": predictions.tolist(),
+            "class_ids": class_ids.tolist(),
+            "probabilities": [p if ok else None for p, ok in zip(confidence.tolist(), check.valid.tolist())],
+        }
+        if not check.all_valid:
+            content["validation"] = check.report()
+        if consistency is not None and not consistency.all_valid:
+            content["consistency"] = consistency.report()
+        return JSONResponse(content)
+
+@app.post("/predict_batch_columnar")
+async def predict_batch_columnar(request: Request, features: str = "full"):
+    # Cùng định dạng với /predict_batch_columnar của App_using_ML:
+    # - application/json: {"Area": [...], "Perimeter": [...], ...}
+    # - application/octet-stream: buffer float64 little-endian (n x 12) theo thứ tự FEATURE_COLS,
+    #   kết quả là buffer float64 (n x 2) gồm [class_id, xác suất của nhãn dự đoán]
+    # - ?features=raw: chỉ 6 số đo thô (shape_features.RAW_COLUMNS), server tự tính 6 cột dẫn xuất
+    if features not in ("full", "raw"):
+        raise HTTPException(status_code=400, detail="features must be 'full' or 'raw'")
+    raw_features = features == "raw"
+    columns = shape_features.RAW_COLUMNS if raw_features else FEATURE_COLS
+    body = await request.body()
+    metrics.observe_parse(request)
+    endpoint = metrics.endpoint_label(request)
+    if model is None:
+        raise HTTPException(status_code=500, detail="Model is not initialized.")
+    is_binary = request.headers.get("content-type", "").startswith(BINARY_MEDIA_TYPE)
+    with metrics.stage(endpoint, "decode"):
+        if is_binary:
+            X = decode_binary(body, len(columns))
+        else:
+            X = decode_columnar_json(body, columns)
+    metrics.observe_rows(request, len(X))
+    return await run_in_threadpool(score_columnar, request, X, is_binary, raw_features)
+
+@app.get("/batching_stats")
+def batching_stats():
+    # Thống kê kích thước batch và thời gian chờ trong queue của /predict
+    return batcher.stats()
+
+@app.get("/ready")
+def ready():
+    # Sẵn sàng khi model đã load và (chế độ bucketed) mọi bucket đã warm-up xong
+    is_ready = model is not None and (bucketed is None or bucketed.ready)
+    content = {"ready": is_ready, "backend": BACKEND}
+    if bucketed is not None:
+        content["warmup_seconds"] = bucketed.stats()["warmup_seconds"]
+    return JSONResponse(content, status_code=200 if is_ready else 503)
+
+@app.get("/bucket_stats")
+def bucket_stats():
+    # Theo từng bucket: số lần gọi, hàng thật / hàng đệm, tỉ lệ lãng phí và độ trễ p50 / p99 (ms)
+    if bucketed is None:
+        raise HTTPException(status_code=404, detail="Bucketed inference is not enabled (PUMPKIN_BACKEND=bucketed).")
+    return bucketed.stats()
+
+@app.get("/cache_stats")
+def cache_stats():
+    # Số lần hit / miss, tỉ lệ hit và kích thước của cache dự đoán
+    return prediction_cache.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
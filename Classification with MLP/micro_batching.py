@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+
+# Gom các request dự đoán 1 hàng đến đồng thời thành một batch duy nhất cho model.
+# Batch được gửi đi khi đủ max_batch_size hàng hoặc khi hàng đầu tiên đã chờ quá max_wait_ms.
+class MicroBatcher:
+    def __init__(self, predict_fn, max_batch_size=64, max_wait_ms=5.0, stats_window=10000):
+        self.predict_fn = predict_fn          # hàm chặn: ma trận (n, d) -> mảng (n,)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        # Thống kê
+        self.n_batches = 0
+        self.n_rows = 0
+        self.max_batch_seen = 0
+        self.batch_size_counts = {}
+        self._queue_waits = deque(maxlen=stats_window)
+        self._batch_sizes = deque(maxlen=stats_window)
+
+    def _ensure_worker(self):
+        # Queue và worker gắn với event loop đang chạy (tạo lại nếu loop thay đổi)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, row):
+        # row: mảng 1 chiều gồm d đặc trưng -> kết quả của model cho hàng đó
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((np.asarray(row, dtype=np.float64), future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        first = await self._queue.get()
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Lấy thêm các request đã nằm sẵn trong queue mà không chờ
+        while len(batch) < self.max_batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Bỏ qua các request mà client đã hủy trong lúc chờ
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self._record(len(batch), [started - item[2] for item in batch])
+
+            X = np.vstack([item[0] for item in batch])
+            try:
+                outputs = await self._loop.run_in_executor(None, self.predict_fn, X)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    def _record(self, batch_size, queue_waits):
+        self.n_batches += 1
+        self.n_rows += batch_size
+        self.max_batch_seen = max(self.max_batch_seen, batch_size)
+        self.batch_size_counts[batch_size] = self.batch_size_counts.get(batch_size, 0) + 1
+        self._batch_sizes.append(batch_size)
+        self._queue_waits.extend(queue_waits)
+
+    def stats(self):
+        waits_ms = np.array(self._queue_waits) * 1000.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.n_batches,
+            "rows": self.n_rows,
+            "mean_batch_size": self.n_rows / self.n_batches if self.n_batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "queue_wait_ms": {
+                "mean": float(waits_ms.mean()) if len(waits_ms) else 0.0,
+                "p50": float(np.percentile(waits_ms, 50)) if len(waits_ms) else 0.0,
+                "p99": float(np.percentile(waits_ms, 99)) if len(waits_ms) else 0.0,
+                "max": float(waits_ms.max()) if len(waits_ms) else 0.0,
+            },
+        }
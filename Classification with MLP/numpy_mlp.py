@@ -0,0 +1,284 @@
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from quantization import PRECISIONS, dequantize, quantize
+
+# Engine suy luận NumPy thuần cho MLP 12 -> 64 -> 32 -> 1, không cần tensorflow lúc chạy.
+# StandardScaler được gộp vào lớp Dense đầu tiên, Dropout bị bỏ (chỉ có tác dụng lúc train).
+
+KERAS_PATH = 'pumpkin_model.keras'
+SCALER_PATH = 'scaler.joblib'
+EXPORT_PATH = 'pumpkin_model.npz'
+# File trọng số được phục vụ; PUMPKIN_WEIGHTS_PATH=pumpkin_model_int8.npz để dùng bản đã lượng tử hóa
+WEIGHTS_PATH = os.environ.get("PUMPKIN_WEIGHTS_PATH", EXPORT_PATH)
+
+# Sai lệch tuyệt đối tối đa cho phép giữa xác suất của NumPy và Keras
+TOLERANCE = 1e-5
+
+THROUGHPUT_ROWS = 200000
+
+ACTIVATIONS = {
+    "relu": lambda z: np.maximum(z, 0, out=z),
+    "sigmoid": lambda z: np.exp(-np.logaddexp(0, -z)),
+    "linear": lambda z: z,
+}
+
+
+class NumpyMLP:
+    def __init__(self, weights, biases, activations, input_mean=None, input_scale=None):
+        self.weights = weights
+        self.biases = biases
+        self.activations = activations
+        # Với bản lượng tử hóa, scaler KHÔNG được gộp vào Dense đầu tiên (trọng số gộp chênh nhau nhiều bậc
+        # giữa các cột, một scale int8 chung cho cả ma trận sẽ làm tròn các trọng số nhỏ về 0) mà áp dụng riêng
+        self.input_mean = input_mean
+        self.input_scale = input_scale
+
+    @classmethod
+    def load(cls, path=WEIGHTS_PATH):
+        data = np.load(path)
+        n_layers = int(data["n_layers"])
+        weights = []
+        for i in range(n_layers):
+            W = data[f"W{i}"]
+            if f"W{i}_scale" in data.files:
+                W = dequantize(W, float(data[f"W{i}_scale"]))
+            weights.append(W)
+        biases = [data[f"b{i}"] for i in range(n_layers)]
+        activations = [str(a) for a in data["activations"]]
+        if "input_mean" in data.files:
+            return cls(weights, biases, activations, data["input_mean"], data["input_scale"])
+        return cls(weights, biases, activations)
+
+    def save(self, path, precision="float64"):
+        # precision="float16" / "int8": ma trận trọng số lưu ở độ chính xác thấp (+ scale), bias lưu float32
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {list(PRECISIONS)}")
+        arrays = {}
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            if precision == "float64":
+                arrays[f"W{i}"], arrays[f"b{i}"] = W, b
+            else:
+                arrays[f"W{i}"], arrays[f"W{i}_scale"] = quantize(W, precision)
+                arrays[f"b{i}"] = np.asarray(b, dtype=np.float32)
+        if self.input_mean is not None:
+            arrays["input_mean"], arrays["input_scale"] = self.input_mean, self.input_scale
+        np.savez(path, n_layers=len(self.weights), activations=np.array(self.activations),
+                 precision=precision, **arrays)
+
+    def save_shared(self, directory):
+        # Mỗi mảng trọng số một file .npy (file .npz không mmap được) để các worker cùng mmap một bản
+        os.makedirs(directory, exist_ok=True)
+        for i, (W, b) in enumerate(zip(self.weights, self.biases)):
+            np.save(os.path.join(directory, f"W{i}.npy"), np.ascontiguousarray(W))
+            np.save(os.path.join(directory, f"b{i}.npy"), np.ascontiguousarray(b))
+        np.save(os.path.join(directory, "activations.npy"), np.array(self.activations))
+        if self.input_mean is not None:
+            np.save(os.path.join(directory, "input_mean.npy"), self.input_mean)
+            np.save(os.path.join(directory, "input_scale.npy"), self.input_scale)
+
+    @classmethod
+    def load_shared(cls, directory, mmap_mode="r"):
+        activations = [str(a) for a in np.load(os.path.join(directory, "activations.npy"))]
+        weights = [np.load(os.path.join(directory, f"W{i}.npy"), mmap_mode=mmap_mode) for i in range(len(activations))]
+        biases = [np.load(os.path.join(directory, f"b{i}.npy"), mmap_mode=mmap_mode) for i in range(len(activations))]
+        if os.path.exists(os.path.join(directory, "input_mean.npy")):
+            return cls(weights, biases, activations, np.load(os.path.join(directory, "input_mean.npy")),
+                       np.load(os.path.join(directory, "input_scale.npy")))
+        return cls(weights, biases, activations)
+
+    def predict(self, X):
+        # X: ma trận (n, 12) CHƯA chuẩn hóa -> ma trận (n, 1) giống model.predict của Keras
+        h = np.asarray(X, dtype=np.float64)
+        if self.input_mean is not None:
+            h = (h - self.input_mean) / self.input_scale
+        h = h.astype(self.weights[0].dtype, copy=False)
+        for W, b, activation in zip(self.weights, self.biases, self.activations):
+            h = ACTIVATIONS[activation](h @ W + b)
+        return h
+
+
+def keras_layers(model):
+    # (weights, biases, activations) của các lớp Dense theo thứ tự, bỏ qua Dropout
+    import tensorflow as tf
+
+    weights, biases, activations = [], [], []
+    for layer in model.layers:
+        if isinstance(layer, tf.keras.layers.Dropout):
+            continue
+        if not isinstance(layer, tf.keras.layers.Dense):
+            raise ValueError(f"Unsupported layer: {layer.name} ({type(layer).__name__})")
+        kernel, bias = layer.get_weights()
+        weights.append(kernel.astype(np.float64))
+        biases.append(bias.astype(np.float64))
+        activations.append(layer.activation.__name__)
+    return weights, biases, activations
+
+
+def export_weights(keras_path=KERAS_PATH, scaler_path=SCALER_PATH, out_path=EXPORT_PATH):
+    # Đọc model Keras + scaler, gộp scaler vào Dense đầu tiên rồi lưu ra file .npz
+    import joblib
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_path)
+    scaler = joblib.load(scaler_path)
+    weights, biases, activations = keras_layers(model)
+
+    # ((x - mean) / scale) @ W + b  ==  x @ (W / scale[:, None]) + (b - (mean / scale) @ W)
+    mean, scale = scaler.mean_, scaler.scale_
+    biases[0] = biases[0] - (mean / scale) @ weights[0]
+    weights[0] = weights[0] / scale[:, None]
+
+    NumpyMLP(weights, biases, activations).save(out_path)
+    print(f"Exported {len(weights)} Dense layers to {out_path} ({os.path.getsize(out_path)} bytes)")
+    return model, scaler
+
+
+def check_against_keras(model, scaler, out_path=EXPORT_PATH, n_rows=10000, seed=42):
+    # So sánh đầu ra NumPy với Keras trên dữ liệu ngẫu nhiên quanh phân phối của scaler
+    rng = np.random.default_rng(seed)
+    X = scaler.mean_ + scaler.scale_ * rng.normal(size=(n_rows, len(scaler.mean_))) * 2
+    expected = model.predict(scaler.transform(X), verbose=0)
+    actual = NumpyMLP.load(out_path).predict(X)
+    max_diff = float(np.abs(expected - actual).max())
+    same_labels = bool(((expected > 0.5) == (actual > 0.5)).all())
+    print(f"Max |keras - numpy| = {max_diff:.2e} (tolerance {TOLERANCE:.0e}), same labels: {same_labels}")
+    if max_diff > TOLERANCE:
+        raise SystemExit("NumPy engine does not match Keras within tolerance")
+
+
+def held_out_data(data_path=None, synthetic_rows=None):
+    # Phần test của cách chia trong train_MLP.py (80/20, stratify, random_state=42), nhãn 0 / 1
+    from sklearn.model_selection import train_test_split
+
+    if synthetic_rows:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+        import synthetic
+        X, y = synthetic.generate(synthetic_rows)
+    else:
+        from dataset_cache import read_dataset
+        df = read_dataset(data_path)
+        X, y = df.drop(columns=["Class"]), df["Class"]
+    y = (y == "Ürgüp Sivrisi").astype(int)
+    _, X_test, _, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    return X_test.to_numpy(dtype=np.float64), y_test.to_numpy()
+
+
+def measure_throughput(mlp, X):
+    mlp.predict(X[:1000])
+    start = time.perf_counter()
+    mlp.predict(X)
+    return len(X) / (time.perf_counter() - start)
+
+
+def export_quantized(X_test, y_test, precisions=PRECISIONS[1:], max_disagreement=0.005, max_accuracy_drop=0.005):
+    # Export pumpkin_model_<precision>.npz cho từng độ chính xác; chỉ ghi file nếu trên tập test giữ lại
+    # tỉ lệ nhãn khác Keras <= max_disagreement và accuracy giảm <= max_accuracy_drop. Trả về danh sách bị loại.
+    import joblib
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(KERAS_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    weights, biases, activations = keras_layers(model)
+    expected = model.predict(scaler.transform(X_test), verbose=0)
+    expected_labels = expected[:, 0] > 0.5
+    expected_accuracy = np.mean(expected_labels == y_test)
+    X_bench = np.resize(X_test, (THROUGHPUT_ROWS, X_test.shape[1]))
+
+    rows, rejected = [], []
+    for precision in PRECISIONS:
+        if precision != "float64" and precision not in precisions:
+            continue
+        out_path = EXPORT_PATH if precision == "float64" else f"pumpkin_model_{precision}.npz"
+        tmp_path = out_path + ".tmp.npz"
+        try:
+            if precision == "float64":
+                # Mốc so sánh: bản float64 đang phục vụ (scaler gộp vào Dense đầu tiên)
+                mlp = NumpyMLP(list(weights), list(biases), activations)
+                mlp.biases[0] = biases[0] - (scaler.mean_ / scaler.scale_) @ weights[0]
+                mlp.weights[0] = weights[0] / scaler.scale_[:, None]
+            else:
+                mlp = NumpyMLP(weights, biases, activations, scaler.mean_, scaler.scale_)
+            mlp.save(tmp_path, precision)
+            loaded = NumpyMLP.load(tmp_path)
+            actual = loaded.predict(X_test)
+            agreement = np.mean((actual[:, 0] > 0.5) == expected_labels)
+            accuracy = np.mean((actual[:, 0] > 0.5) == y_test)
+            passed = 1 - agreement <= max_disagreement and expected_accuracy - accuracy <= max_accuracy_drop
+            memory = sum(a.nbytes for a in loaded.weights + loaded.biases)
+            rows.append((precision, os.path.getsize(tmp_path), memory, measure_throughput(loaded, X_bench), accuracy,
+                         agreement, float(np.abs(actual - expected).max()), "saved" if passed else "rejected"))
+            if precision == "float64":
+                continue
+            if passed:
+                os.replace(tmp_path, out_path)
+            else:
+                rejected.append(out_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    print(f"\n{'Precision':<10}{'Size (KB)':>10}{'Memory (KB)':>12}{'Rows/s':>12}{'Accuracy':>10}"
+          f"{'Agreement':>11}{'Max |dp|':>10}  Status")
+    for precision, size, memory, rows_per_s, accuracy, agreement, max_diff, status in rows:
+        if precision == "float64":
+            status = "reference"
+        print(f"{precision:<10}{size / 1024:>10.1f}{memory / 1024:>12.1f}{rows_per_s:>12.0f}{accuracy:>10.4f}"
+              f"{agreement:>11.4f}{max_diff:>10.1e}  {status}")
+    print(f"Held-out rows: {len(X_test)}, Keras accuracy: {expected_accuracy:.4f}")
+    return rejected
+
+
+def measure_startup(backend):
+    # Thời gian import main.py và RSS tối đa của một process mới với backend cho trước
+    code = (
+        "import time, resource; t = time.perf_counter(); import main; "
+        "print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, "
+        "'tensorflow' in __import__('sys').modules)"
+    )
+    env = dict(os.environ, PUMPKIN_BACKEND=backend, TF_CPP_MIN_LOG_LEVEL="3")
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    seconds, max_rss_kb, tf_loaded = out.stdout.strip().splitlines()[-1].split()
+    return float(seconds), int(max_rss_kb) / 1024, tf_loaded == "True"
+
+
+def compare_startup():
+    for backend in ("keras", "numpy"):
+        seconds, rss_mb, tf_loaded = measure_startup(backend)
+        print(f"{backend:6s}: startup {seconds:6.2f} s, max RSS {rss_mb:7.1f} MB, tensorflow imported: {tf_loaded}")
+
+
+if __name__ == "__main__":
+    # python numpy_mlp.py export   -> tạo pumpkin_model.npz và kiểm tra sai số với Keras
+    # python numpy_mlp.py compare  -> so sánh thời gian khởi động và bộ nhớ của 2 backend
+    # python numpy_mlp.py quantize --data Pumpkin_Seeds_Dataset.xlsx  -> pumpkin_model_float16.npz / _int8.npz
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    if command == "export":
+        start = time.perf_counter()
+        model, scaler = export_weights()
+        check_against_keras(model, scaler)
+        print(f"Done in {time.perf_counter() - start:.1f} s")
+    elif command == "compare":
+        compare_startup()
+    elif command == "quantize":
+        import argparse
+        parser = argparse.ArgumentParser(prog="numpy_mlp.py quantize",
+                                         description="Export float16 / int8 weights with an accuracy gate")
+        parser.add_argument("--data", default=os.environ.get("PUMPKIN_DATASET"))
+        parser.add_argument("--synthetic", type=int, default=None, help="Dùng N hàng dữ liệu giả lập thay cho --data")
+        parser.add_argument("--precisions", nargs="+", choices=PRECISIONS[1:], default=list(PRECISIONS[1:]))
+        parser.add_argument("--max-disagreement", type=float, default=0.005)
+        parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+        args = parser.parse_args(sys.argv[2:])
+        if not args.data and not args.synthetic:
+            parser.error("--data (or PUMPKIN_DATASET) or --synthetic is required")
+        X_test, y_test = held_out_data(args.data, args.synthetic)
+        rejected = export_quantized(X_test, y_test, args.precisions, args.max_disagreement, args.max_accuracy_drop)
+        if rejected:
+            raise SystemExit(f"Rejected (not written): {rejected}")
+    else:
+        raise SystemExit(f"Unknown command: {command}")
@@ -0,0 +1,25 @@
+import numpy as np
+
+# Lượng tử hóa trọng số cho các bản float16 / int8 (fast_pipeline.py bên App_using_ML, numpy_mlp.py bên
+# Classification with MLP). File này giống hệt nhau ở hai thư mục: sửa một bản thì chép sang bản kia.
+# int8 dùng một hệ số scale cho mỗi mảng (per-tensor).
+
+PRECISIONS = ("float64", "float16", "int8")
+
+
+def quantize(values, precision):
+    # -> (mảng lưu trữ, scale) với giá trị khôi phục = mảng lưu trữ * scale
+    values = np.asarray(values, dtype=np.float64)
+    if precision == "float16":
+        return values.astype(np.float16), 1.0
+    if precision == "int8":
+        max_abs = float(np.abs(values).max()) if values.size else 0.0
+        scale = max_abs / 127 if max_abs > 0 else 1.0
+        return np.clip(np.round(values / scale), -127, 127).astype(np.int8), scale
+    raise ValueError(f"precision must be one of {list(PRECISIONS[1:])}")
+
+
+def dequantize(stored, scale):
+    # Khôi phục thành float32: trọng số đã mất nhiều độ chính xác hơn mức float32 làm mất thêm,
+    # và tính toán bằng float32 nhanh hơn float64
+    return stored.astype(np.float32) * np.float32(scale)
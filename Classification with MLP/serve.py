@@ -0,0 +1,56 @@
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import uvicorn
+
+from numpy_mlp import NumpyMLP, WEIGHTS_PATH
+
+# Chạy API với nhiều worker uvicorn dùng chung một bản trọng số chỉ đọc:
+#   - process master chuyển model Keras sang engine NumPy (nếu chưa có pumpkin_model.npz) và ghi các ma trận
+#     trọng số ra file .npy trong /dev/shm;
+#   - mỗi worker chạy với PUMPKIN_BACKEND=numpy và mmap các file đó: không worker nào import tensorflow
+#     hay giữ bản sao trọng số riêng.
+#
+#   python serve.py --workers 4
+#   python serve.py --workers 4 --no-share      # so sánh: mỗi worker tự load theo PUMPKIN_BACKEND
+
+
+def shared_memory_root():
+    # /dev/shm là tmpfs trên Linux; hệ khác dùng thư mục tạm (vẫn chia sẻ qua page cache)
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def serve():
+    parser = argparse.ArgumentParser(description="Serve the MLP API with N workers sharing read-only weights")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shared-dir", default=None, help="Thư mục export trọng số (mặc định: thư mục tạm trong /dev/shm)")
+    parser.add_argument("--no-share", action="store_true", help="Không export: mỗi worker load model riêng")
+    args = parser.parse_args()
+
+    directory = None
+    if args.no_share:
+        os.environ.pop("PUMPKIN_SHARED_MODEL_DIR", None)
+    else:
+        if not os.path.exists(WEIGHTS_PATH):
+            # Export ở process con để master không phải giữ tensorflow trong bộ nhớ
+            subprocess.run([sys.executable, "numpy_mlp.py", "export"], check=True)
+        directory = args.shared_dir or tempfile.mkdtemp(prefix="pumpkin-mlp-", dir=shared_memory_root())
+        NumpyMLP.load(WEIGHTS_PATH).save_shared(directory)
+        print(f"Exported {WEIGHTS_PATH} to {directory}")
+        os.environ["PUMPKIN_BACKEND"] = "numpy"
+        os.environ["PUMPKIN_SHARED_MODEL_DIR"] = directory
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if directory is not None and args.shared_dir is None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    serve()
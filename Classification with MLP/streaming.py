@@ -0,0 +1,43 @@
+import itertools
+
+import pandas as pd
+
+# Số hàng mặc định của mỗi chunk khi xử lý file theo kiểu streaming
+DEFAULT_CHUNK_ROWS = 50000
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def iter_upload_chunks(fileobj, filename, chunk_rows=DEFAULT_CHUNK_ROWS):
+    # CSV được đọc từng chunk cố định nên bộ nhớ không phụ thuộc kích thước file.
+    # Excel không đọc được theo chunk: đọc toàn bộ rồi chia nhỏ để vẫn trả kết quả dần dần.
+    if filename.endswith('.csv'):
+        yield from pd.read_csv(fileobj, chunksize=chunk_rows)
+    else:
+        df = pd.read_excel(fileobj)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].copy()
+
+
+def peek_first_chunk(chunks):
+    # Lấy chunk đầu tiên (để kiểm tra cột trước khi bắt đầu stream) mà không làm mất nó
+    chunks = iter(chunks)
+    first = next(chunks, None)
+    if first is None:
+        return None, iter(())
+    return first, itertools.chain([first], chunks)
+
+
+def stream_results(chunks, label_chunk, output_format="ndjson"):
+    # Dự đoán và ghi kết quả từng chunk ngay khi xong, không giữ toàn bộ file trong bộ nhớ
+    header = True
+    for chunk in chunks:
+        chunk = label_chunk(chunk)
+        if output_format == "csv":
+            yield chunk.to_csv(index=False, header=header)
+            header = False
+        else:
+            yield chunk.to_json(orient="records", lines=True, force_ascii=False)
@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Kiểm tra miền giá trị của 12 đặc trưng trên cả cột một lúc (thay cho Field(gt=..., lt=...) kiểm tra từng hàng):
+# hàng không hợp lệ được đánh dấu và báo lỗi riêng, các hàng còn lại vẫn được dự đoán.
+
+# (cận dưới, cận trên) loại trừ cho từng cột; None = không giới hạn
+RANGES = {
+    "Area": (0, None),
+    "Perimeter": (0, None),
+    "Major_Axis_Length": (0, None),
+    "Minor_Axis_Length": (0, None),
+    "Convex_Area": (0, None),
+    "Equiv_Diameter": (0, None),
+    "Eccentricity": (0, 1),
+    "Solidity": (0, 1),
+    "Extent": (0, 1),
+    "Roundness": (0, 1),
+    "Aspect_Ration": (0, 4),
+    "Compactness": (0, 1),
+}
+
+# Số hàng lỗi tối đa liệt kê trong báo cáo (tổng số lỗi theo cột vẫn đếm đủ)
+MAX_REPORTED_ROWS = int(os.environ.get("PUMPKIN_MAX_REPORTED_ROWS", "1000"))
+
+
+class ValidationResult:
+    def __init__(self, n_rows, valid, messages, by_column):
+        self.n_rows = n_rows
+        self.valid = valid              # mảng bool (n,): True nếu hàng được dự đoán
+        self.messages = messages        # mảng object (n,): thông báo lỗi của hàng, None nếu hợp lệ
+        self.by_column = by_column      # {cột: số hàng lỗi ở cột đó}
+
+    @property
+    def n_invalid(self):
+        return int(self.n_rows - np.count_nonzero(self.valid))
+
+    @property
+    def all_valid(self):
+        return self.n_invalid == 0
+
+    def report(self, max_rows=MAX_REPORTED_ROWS):
+        # Báo cáo gọn: số lượng + danh sách (tối đa max_rows) {"row": chỉ số hàng, "error": thông báo}
+        invalid_rows = np.flatnonzero(~self.valid)
+        return {
+            "n_rows": self.n_rows,
+            "n_valid": self.n_rows - self.n_invalid,
+            "n_invalid": self.n_invalid,
+            "by_column": self.by_column,
+            "errors": [{"row": int(i), "error": self.messages[i]} for i in invalid_rows[:max_rows]],
+            "truncated": len(invalid_rows) > max_rows,
+        }
+
+
+def to_matrix(df, columns):
+    # DataFrame -> ma trận (n, len(columns)) float64; giá trị không phải số (ô trống, chuỗi) thành NaN
+    # để được báo lỗi theo hàng thay vì làm hỏng cả file
+    X = np.empty((len(df), len(columns)), dtype=np.float64)
+    for j, col in enumerate(columns):
+        X[:, j] = pd.to_numeric(df[col], errors="coerce")
+    return X
+
+
+def bounds(columns):
+    # Vector cận dưới / cận trên theo thứ tự cột (-inf / inf nếu không giới hạn)
+    lower = np.array([-np.inf if RANGES.get(c, (None, None))[0] is None else RANGES[c][0] for c in columns], dtype=np.float64)
+    upper = np.array([np.inf if RANGES.get(c, (None, None))[1] is None else RANGES[c][1] for c in columns], dtype=np.float64)
+    return lower, upper
+
+
+def validate(X, columns):
+    # Một phép so sánh trên cả ma trận: NaN không thỏa mãn bất đẳng thức nào và ±inf vượt cận (kể cả cận vô hạn),
+    # nên mọi giá trị không hữu hạn cũng bị đánh dấu. Thông báo chỉ được tạo cho các hàng lỗi.
+    # reshape: batch rỗng dạng (0,) không so sánh được với vector cận (12,)
+    X = np.asarray(X, dtype=np.float64).reshape(-1, len(columns))
+    n_rows = len(X)
+    lower, upper = bounds(columns)
+    with np.errstate(invalid="ignore"):
+        valid = ((X > lower) & (X < upper)).all(axis=1)
+    if valid.all():
+        return ValidationResult(n_rows, valid, None, {})
+
+    invalid_rows = np.flatnonzero(~valid)
+    bad = X[invalid_rows]
+    finite = np.isfinite(bad)
+    detail = np.full(len(invalid_rows), None, dtype=object)
+    by_column = {}
+    for j, col in enumerate(columns):
+        values = bad[:, j]
+        for mask, reason in ((~finite[:, j], "is missing or not a finite number"),
+                             (finite[:, j] & (values <= lower[j]), f"must be > {lower[j]:g}"),
+                             (finite[:, j] & (values >= upper[j]), f"must be < {upper[j]:g}")):
+            if not mask.any():
+                continue
+            by_column[col] = by_column.get(col, 0) + int(np.count_nonzero(mask))
+            # Ghép thông báo theo cột (vài chục phép toán trên mảng), không lặp theo hàng
+            text = np.char.add(f"{col} {reason} (got ", np.char.mod("%g", values[mask]).astype(str))
+            text = np.char.add(text, ")").astype(object)
+            previous = detail[mask]
+            has_previous = previous != None  # noqa: E711 (so sánh từng phần tử của mảng object)
+            text[has_previous] = previous[has_previous] + "; " + text[has_previous]
+            detail[mask] = text
+    messages = np.full(n_rows, None, dtype=object)
+    messages[invalid_rows] = detail
+    return ValidationResult(n_rows, valid, messages, by_column)
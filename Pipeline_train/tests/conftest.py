@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Các script train import my_transformers / dataset_cache như file phẳng khi chạy từ Pipeline_train;
+# synthetic.py (dữ liệu giả lập) nằm trong benchmarks/
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.dirname(HERE), os.path.join(HERE, "..", "..", "benchmarks")]
@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import my_transformers
+import synthetic
+from my_transformers import CorrelationDropper, OutlierHandler, QuantileSketch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUANTILES = (0.01, 0.25, 0.5, 0.75, 0.99)
+# Sai số thứ hạng chuẩn hóa cho phép với k = 200 (đo được: trung bình ~0.2%, tối đa ~0.6%)
+RANK_TOLERANCE = 0.01
+
+
+def rank_error(sorted_values, estimate, q):
+    # |rank(q̂) - q| với rank lấy theo khoảng [vị trí đầu, vị trí cuối] của q̂ trong dữ liệu đã sắp xếp
+    low = np.searchsorted(sorted_values, estimate, side="left") / (len(sorted_values) - 1)
+    high = (np.searchsorted(sorted_values, estimate, side="right") - 1) / (len(sorted_values) - 1)
+    return 0.0 if low <= q <= high else min(abs(low - q), abs(high - q))
+
+
+def test_app_copy_is_identical():
+    # App_using_ML unpickle pipeline cần cùng định nghĩa class
+    with open(os.path.join(HERE, "..", "my_transformers.py"), "rb") as a, \
+            open(os.path.join(HERE, "..", "..", "App_using_ML", "my_transformers.py"), "rb") as b:
+        assert a.read() == b.read()
+
+
+@pytest.mark.parametrize("chunk_rows", [1000, 25000])
+def test_merged_sketch_quantiles_stay_within_rank_tolerance(chunk_rows):
+    rng = np.random.default_rng(0)
+    values = rng.lognormal(mean=11, sigma=0.4, size=200000)
+    # 4 shard, mỗi shard cập nhật theo chunk rồi gộp lại
+    shards = []
+    for i, shard in enumerate(np.array_split(values, 4)):
+        sketch = QuantileSketch(k=200, seed=i)
+        for start in range(0, len(shard), chunk_rows):
+            sketch.update(shard[start:start + chunk_rows])
+        shards.append(sketch)
+    merged = shards[0]
+    for sketch in shards[1:]:
+        merged.merge(sketch)
+
+    assert merged.n == len(values)
+    assert merged.quantile(0) == values.min() and merged.quantile(1) == values.max()
+    assert sum(len(items) for items in merged.levels) < 3 * merged.k
+    sorted_values = np.sort(values)
+    for q in QUANTILES:
+        assert rank_error(sorted_values, merged.quantile(q), q) <= RANK_TOLERANCE
+
+
+def test_outlier_handler_partial_fit_and_merge_track_fit(monkeypatch):
+    # Sketch của partial_fit lấy mẫu ngẫu nhiên: cố định seed để test tất định
+    monkeypatch.setattr(my_transformers, "QuantileSketch", lambda k: QuantileSketch(k, seed=0))
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({"a": rng.normal(100, 10, 60000), "b": rng.lognormal(3, 0.5, 60000)})
+    exact = OutlierHandler(columns=["a", "b"]).fit(df)
+
+    left, right = OutlierHandler(columns=["a", "b"]), OutlierHandler(columns=["a", "b"])
+    for start in range(0, 30000, 5000):
+        left.partial_fit(df.iloc[start:start + 5000])
+        right.partial_fit(df.iloc[30000 + start:30000 + start + 5000])
+    merged = left.merge(right)
+
+    for col in ("a", "b"):
+        sorted_values = np.sort(df[col].to_numpy())
+        assert rank_error(sorted_values, merged.medians_[col], 0.5) <= RANK_TOLERANCE
+        iqr = exact.bounds_[col][1] - exact.bounds_[col][0]
+        # Cận IQR chỉ lệch một phần nhỏ so với fit() chính xác
+        assert np.allclose(merged.bounds_[col], exact.bounds_[col], atol=0.02 * iqr)
+    # So tập hàng bị coi là outlier (giá trị thay thế là median ước lượng nên không so trực tiếp)
+    flagged_differently = ((merged.transform(df) != df) != (exact.transform(df) != df)).any(axis=1).mean()
+    assert flagged_differently <= 0.005
+
+
+@pytest.mark.parametrize("threshold", [0.8, 0.9, 0.95, 0.99])
+def test_correlation_dropper_partial_fit_and_merge_match_fit(threshold):
+    X, _ = synthetic.generate(40000, seed=2, outlier_rate=0.01)
+    exact = CorrelationDropper(threshold).fit(X)
+    # 3 shard kích thước khác nhau, mỗi shard partial_fit theo chunk rồi gộp
+    shards = []
+    for shard in (X.iloc[:7000], X.iloc[7000:22000], X.iloc[22000:]):
+        dropper = CorrelationDropper(threshold)
+        for start in range(0, len(shard), 3000):
+            dropper.partial_fit(shard.iloc[start:start + 3000])
+        shards.append(dropper)
+    merged = shards[0].merge(shards[1]).merge(shards[2])
+
+    if threshold <= 0.95:
+        assert exact.to_drop_  # so sánh có ý nghĩa: ở các ngưỡng này dữ liệu giả lập có cột bị loại
+    assert merged.to_drop_ == exact.to_drop_
+    assert np.allclose(merged.stats_.correlation(), X.corr().to_numpy(), atol=1e-12)
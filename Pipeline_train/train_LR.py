@@ -6,10 +6,11 @@ from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LogisticRegression
 import joblib
+from dataset_cache import read_dataset
 from my_transformers import OutlierHandler, CorrelationDropper
 
 # 1. Đọc dữ liệu
-df = pd.read_excel('D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx')
+df = read_dataset('D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx')
 X = df.drop(columns=["Class"])
 y = df["Class"]
 
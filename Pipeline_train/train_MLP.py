@@ -7,9 +7,10 @@ from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import joblib
+from dataset_cache import read_dataset
 
 # 1. Load dữ liệu
-df = pd.read_excel('D:\Pumkin\Pumpkin_Seeds_Dataset\Pumpkin_Seeds_Dataset.xlsx')
+df = read_dataset('D:\Pumkin\Pumpkin_Seeds_Dataset\Pumpkin_Seeds_Dataset.xlsx')
 
 # Mã hoá nhãn
 df['Class'] = df['Class'].map({'Çerçevelik': 0, 'Ürgüp Sivrisi': 1})
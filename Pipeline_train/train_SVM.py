@@ -1,3 +1,6 @@
+import argparse
+import sys
+import time
 import pandas as pd
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
@@ -5,11 +8,23 @@ from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.svm import SVC # Import thêm thư viện SVM
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
 import joblib
+from dataset_cache import read_dataset
 from my_transformers import OutlierHandler, CorrelationDropper
 
+parser = argparse.ArgumentParser(description="Train the SVM pipeline")
+parser.add_argument("--data", default='D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx')
+parser.add_argument("--approx", action="store_true",
+                    help="Train thêm biến thể xấp xỉ kernel (Nystroem + LogisticRegression)")
+parser.add_argument("--n-components", type=int, default=100, help="Số điểm mốc của Nystroem")
+parser.add_argument("--max-accuracy-drop", type=float, default=0.01,
+                    help="Độ chính xác val/test của bản xấp xỉ được phép thấp hơn SVC tối đa bao nhiêu")
+args = parser.parse_args()
+
 # 1. Đọc dữ liệu
-df = pd.read_excel('D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx')
+df = read_dataset(args.data)
 X = df.drop(columns=["Class"])
 y = df["Class"]
 
@@ -44,3 +59,46 @@ y_pred = full_pipeline.predict(X_test)
 # 6. Lưu Pipeline lại để sử dụng cho thực tế
 joblib.dump(full_pipeline, 'model_svm_pipeline.pkl')
 
+# 7. (Tùy chọn) Biến thể xấp xỉ kernel: ánh xạ Nystroem tường minh + LogisticRegression.
+# Chi phí dự đoán O(n_components x features) mỗi hàng thay vì O(n_support_vectors x features),
+# LogisticRegression cho xác suất trực tiếp (không cần Platt scaling / cross-validation như SVC).
+def measure(pipeline, X_eval, n_single=200, n_batch=100000):
+    single = X_eval.iloc[[0]]
+    times = []
+    for _ in range(n_single):
+        start = time.perf_counter()
+        pipeline.predict_proba(single)
+        times.append(time.perf_counter() - start)
+    batch = X_eval.sample(n_batch, replace=True, random_state=0)
+    start = time.perf_counter()
+    pipeline.predict_proba(batch)
+    return np.median(times) * 1000, n_batch / (time.perf_counter() - start)
+
+if args.approx:
+    svc = full_pipeline.named_steps["clf"]
+    approx_pipeline = Pipeline([
+        ("outlier_remover", OutlierHandler(columns=cols_outliers)),
+        ("corr_dropper", CorrelationDropper(threshold=0.95)),
+        ("scaler", StandardScaler()),
+        # Cùng gamma với SVC để xấp xỉ đúng kernel mà SVC đã dùng
+        ("feature_map", Nystroem(kernel="rbf", gamma=svc._gamma, n_components=args.n_components, random_state=42)),
+        ("clf", LogisticRegression(C=10.0, class_weight="balanced", max_iter=1000))
+    ])
+    approx_pipeline.fit(X_train, y_train)
+
+    print(f"\n{'Model':<22}{'Val':>8}{'Test':>8}{'1 row (ms)':>12}{'Rows/s':>12}")
+    scores = {}
+    for name, pipeline in (("SVC (exact)", full_pipeline), ("Nystroem + LR", approx_pipeline)):
+        scores[name] = (pipeline.score(X_val, y_val), pipeline.score(X_test, y_test))
+        latency_ms, rows_per_s = measure(pipeline, X_test)
+        print(f"{name:<22}{scores[name][0]:>8.4f}{scores[name][1]:>8.4f}{latency_ms:>12.3f}{rows_per_s:>12.0f}")
+    print(f"Support vectors: {len(svc.support_vectors_)}, Nystroem components: {args.n_components}")
+    print("Agreement with SVC on test:", np.mean(approx_pipeline.predict(X_test) == full_pipeline.predict(X_test)))
+
+    # Cổng chất lượng: chỉ lưu bản xấp xỉ nếu không kém SVC quá max_accuracy_drop trên cả val và test
+    drops = [exact - approx for exact, approx in zip(scores["SVC (exact)"], scores["Nystroem + LR"])]
+    if max(drops) > args.max_accuracy_drop:
+        print(f"Approximate model rejected: accuracy drop {max(drops):.4f} > {args.max_accuracy_drop}")
+        sys.exit(1)
+    joblib.dump(approx_pipeline, 'model_svm_approx_pipeline.pkl')
+    print("Saved model_svm_approx_pipeline.pkl")
@@ -0,0 +1,250 @@
+import argparse
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+from dataset_cache import read_dataset
+from my_transformers import OutlierHandler, CorrelationDropper
+
+# Điểm vào huấn luyện chung cho LR / SVM / MLP:
+#   - đọc và chia dữ liệu một lần (cùng tỉ lệ 80/10/10, random_state=42 như train_LR.py / train_SVM.py);
+#   - fit OutlierHandler + CorrelationDropper + StandardScaler một lần vì chúng không đổi theo tham số của model;
+#   - ghi các mảng đã xử lý ra file .npy, các process con mở bằng mmap (dùng chung page cache, không copy);
+#   - chạy lưới tham số của từng họ model trong ProcessPoolExecutor, chọn theo độ chính xác trên tập val;
+#   - ghi leaderboard.csv và artifact của model tốt nhất mỗi họ (cùng tên file mà các app đang dùng).
+#
+#   python train_all.py --data Pumpkin_Seeds_Dataset.xlsx
+#   python train_all.py --families svm lr --workers 4
+#   python train_all.py --synthetic 5000          # dữ liệu giả lập (benchmarks/synthetic.py)
+
+DEFAULT_DATA = os.environ.get("PUMPKIN_DATASET", "D:/Pumkin/Pumpkin_Seeds_Dataset/Pumpkin_Seeds_Dataset.xlsx")
+
+CLASSES = np.array(["Çerçevelik", "Ürgüp Sivrisi"], dtype=object)
+
+cols_outliers = ['Area', 'Perimeter', 'Major_Axis_Length', 'Minor_Axis_Length', 'Convex_Area',
+                 'Equiv_Diameter']
+
+GRIDS = {
+    "svm": {"C": [0.5, 1.0, 2.0, 4.0, 8.0], "gamma": ["scale", 0.05, 0.125, 0.25]},
+    "lr": {"penalty": ["l1", "l2"], "C": [0.01, 0.1, 1.0, 10.0]},
+    "mlp": {"units": [(32, 16), (64, 32), (128, 64)], "dropout": [0.1, 0.2, 0.3]},
+}
+
+# Tên artifact giống các script train_*.py để App_using_ML / Classification with MLP dùng được ngay
+ARTIFACTS = {"svm": "model_svm_pipeline.pkl", "lr": "model_pipeline.pkl", "mlp": "pumpkin_model.keras"}
+
+# Mỗi họ model dùng một bộ đặc trưng: LR/SVM qua pipeline đầy đủ, MLP dùng 12 cột chỉ chuẩn hóa (như train_MLP.py)
+FEATURE_SETS = {"svm": "pipeline", "lr": "pipeline", "mlp": "scaled"}
+SPLITS = ("train", "val", "test")
+
+
+def load_data(path):
+    # Đọc qua cache cột (dataset_cache.py): chỉ lần đầu mới phải parse file Excel
+    df = read_dataset(path)
+    return df.drop(columns=["Class"]), df["Class"]
+
+
+def split(X, y):
+    X_train, X_temp, y_train, y_temp = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    X_val, X_test, y_val, y_test = train_test_split(X_temp, y_temp, test_size=0.5, random_state=42, stratify=y_temp)
+    return {"train": (X_train, y_train), "val": (X_val, y_val), "test": (X_test, y_test)}
+
+
+def fit_shared_steps(X_train):
+    # Các bước không phụ thuộc tham số của model: chỉ fit một lần cho toàn bộ lưới
+    outlier = OutlierHandler(columns=cols_outliers).fit(X_train)
+    X_clean = outlier.transform(X_train)
+    corr = CorrelationDropper(threshold=0.95).fit(X_clean)
+    scaler = StandardScaler().fit(corr.transform(X_clean))
+    # Scaler riêng cho MLP trên 12 cột gốc
+    mlp_scaler = StandardScaler().fit(X_train)
+    return {"outlier_remover": outlier, "corr_dropper": corr, "scaler": scaler, "mlp_scaler": mlp_scaler}
+
+
+def write_shared_arrays(work_dir, splits, steps):
+    # Ghi một lần; process con đọc bằng np.load(mmap_mode="r")
+    for name in SPLITS:
+        X, y = splits[name]
+        X_pipe = steps["scaler"].transform(steps["corr_dropper"].transform(steps["outlier_remover"].transform(X)))
+        X_mlp = steps["mlp_scaler"].transform(X)
+        codes = pd.Categorical(y, categories=CLASSES).codes.astype(np.int8)
+        np.save(os.path.join(work_dir, f"X_pipeline_{name}.npy"), np.ascontiguousarray(X_pipe, dtype=np.float64))
+        np.save(os.path.join(work_dir, f"X_scaled_{name}.npy"), np.ascontiguousarray(X_mlp, dtype=np.float64))
+        np.save(os.path.join(work_dir, f"y_{name}.npy"), codes)
+
+
+_arrays = {}
+
+
+def shared_array(work_dir, name):
+    # Cache theo process: mỗi worker chỉ mở mmap một lần cho mỗi file
+    path = os.path.join(work_dir, f"{name}.npy")
+    if path not in _arrays:
+        _arrays[path] = np.load(path, mmap_mode="r")
+    return _arrays[path]
+
+
+def candidates(families):
+    for family in families:
+        grid = GRIDS[family]
+        keys = list(grid)
+        for i, values in enumerate(itertools.product(*(grid[k] for k in keys))):
+            yield f"{family}-{i:03d}", family, dict(zip(keys, values))
+
+
+def make_estimator(family, params):
+    if family == "svm":
+        return SVC(kernel='rbf', C=params["C"], gamma=params["gamma"], class_weight="balanced", probability=True)
+    if family == "lr":
+        solver = "liblinear" if params["penalty"] == "l1" else "lbfgs"
+        return LogisticRegression(penalty=params["penalty"], C=params["C"], solver=solver,
+                                  class_weight="balanced", max_iter=1000)
+    raise ValueError(f"Unknown sklearn family: {family}")
+
+
+def fit_mlp(params, X_train, y_train, X_val, y_val):
+    import tensorflow as tf
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Dropout, Input
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    # Nhiều worker chạy song song: mỗi process chỉ dùng một luồng để không tranh CPU
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    layers = [Input(shape=(X_train.shape[1],))]
+    for units in params["units"]:
+        layers += [Dense(units, activation='relu'), Dropout(params["dropout"])]
+    model = Sequential(layers + [Dense(1, activation='sigmoid')])
+    model.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    early_stop = EarlyStopping(monitor='val_loss', patience=15, restore_best_weights=True)
+    model.fit(X_train, y_train, validation_data=(X_val, y_val),
+              epochs=100, batch_size=32, callbacks=[early_stop], verbose=0)
+    return model
+
+
+def run_candidate(work_dir, candidate_id, family, params):
+    # Chạy trong process con: đọc dữ liệu dùng chung, fit một model, lưu model vào work_dir
+    feature_set = FEATURE_SETS[family]
+    X = {name: shared_array(work_dir, f"X_{feature_set}_{name}") for name in SPLITS}
+    y = {name: shared_array(work_dir, f"y_{name}") for name in SPLITS}
+
+    start = time.perf_counter()
+    if family == "mlp":
+        model = fit_mlp(params, X["train"], y["train"], X["val"], y["val"])
+        fit_seconds = time.perf_counter() - start
+        scores = {name: float(np.mean((model.predict(X[name], verbose=0)[:, 0] > 0.5) == y[name]))
+                  for name in SPLITS}
+        model_path = os.path.join(work_dir, f"{candidate_id}.keras")
+        model.save(model_path)
+    else:
+        model = make_estimator(family, params).fit(X["train"], CLASSES[y["train"]])
+        fit_seconds = time.perf_counter() - start
+        scores = {name: float(model.score(X[name], CLASSES[y[name]])) for name in SPLITS}
+        model_path = os.path.join(work_dir, f"{candidate_id}.joblib")
+        joblib.dump(model, model_path)
+
+    return {
+        "candidate": candidate_id,
+        "family": family,
+        "params": params,
+        "train_score": scores["train"],
+        "val_score": scores["val"],
+        "test_score": scores["test"],
+        "fit_seconds": round(fit_seconds, 3),
+        "model_path": model_path,
+    }
+
+
+def save_best(best, steps, out_dir):
+    # Ghép lại pipeline đầy đủ từ các bước đã fit chung + classifier tốt nhất
+    family = best["family"]
+    path = os.path.join(out_dir, ARTIFACTS[family])
+    if family == "mlp":
+        shutil.copyfile(best["model_path"], path)
+        joblib.dump(steps["mlp_scaler"], os.path.join(out_dir, "scaler.joblib"))
+    else:
+        full_pipeline = Pipeline([
+            ("outlier_remover", steps["outlier_remover"]),
+            ("corr_dropper", steps["corr_dropper"]),
+            ("scaler", steps["scaler"]),
+            ("clf", joblib.load(best["model_path"])),
+        ])
+        joblib.dump(full_pipeline, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train LR / SVM / MLP hyperparameter grids in parallel")
+    parser.add_argument("--data", default=DEFAULT_DATA, help="File Excel/CSV có cột Class")
+    parser.add_argument("--synthetic", type=int, default=None, help="Dùng N hàng dữ liệu giả lập thay cho --data")
+    parser.add_argument("--families", nargs="+", choices=list(GRIDS), default=list(GRIDS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", default=".", help="Thư mục ghi leaderboard.csv và artifact tốt nhất")
+    parser.add_argument("--work-dir", default=None, help="Thư mục tạm cho mảng dùng chung (mặc định: tempdir)")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+        import synthetic
+        X, y = synthetic.generate(args.synthetic, outlier_rate=0.01)
+    else:
+        X, y = load_data(args.data)
+
+    start = time.perf_counter()
+    splits = split(X, y)
+    steps = fit_shared_steps(splits["train"][0])
+    print(f"Columns dropped by CorrelationDropper: {steps['corr_dropper'].to_drop_}")
+
+    work_dir = tempfile.mkdtemp(prefix="pumpkin_train_", dir=args.work_dir)
+    try:
+        write_shared_arrays(work_dir, splits, steps)
+        todo = list(candidates(args.families))
+        print(f"Training {len(todo)} candidates on {args.workers} worker(s)...")
+        results = []
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(run_candidate, work_dir, *c): c for c in todo}
+            for future in as_completed(futures):
+                candidate_id, family, params = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  {candidate_id} {params} failed: {e}")
+                    continue
+                results.append(result)
+                print(f"  {candidate_id} {params}: val {result['val_score']:.4f} ({result['fit_seconds']:.1f}s)")
+
+        if not results:
+            print("No candidate finished successfully.")
+            return
+        # Chọn theo val (tập test chỉ để báo cáo); hòa thì ưu tiên model fit nhanh hơn
+        leaderboard = pd.DataFrame(results).sort_values(["val_score", "fit_seconds"], ascending=[False, True])
+        os.makedirs(args.out, exist_ok=True)
+        leaderboard.drop(columns=["model_path"]).to_csv(os.path.join(args.out, "leaderboard.csv"), index=False)
+
+        print("\nLeaderboard:")
+        print(leaderboard.drop(columns=["model_path"]).to_string(index=False))
+        for family, group in leaderboard.groupby("family", sort=False):
+            best = group.iloc[0]
+            path = save_best(best, steps, args.out)
+            print(f"Best {family}: {best['candidate']} {best['params']} "
+                  f"val {best['val_score']:.4f} test {best['test_score']:.4f} -> {path}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import synthetic
+
+# So sánh chế độ phục vụ: 1 process (như hiện tại), N worker tự load model riêng, N worker dùng chung model (serve.py).
+# Đo RSS / PSS của từng worker (PSS chia đều các trang nhớ dùng chung cho các process đang chia sẻ chúng,
+# nên tổng PSS mới phản ánh bộ nhớ thật) và throughput tổng khi nhiều client gửi request đồng thời.
+#
+#   python bench_workers.py --workers 4 --duration 10
+#   python bench_workers.py --apps mlp --mlp-backend keras
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIRS = {
+    "app": os.path.join(ROOT, "App_using_ML"),
+    "mlp": os.path.join(ROOT, "Classification with MLP"),
+}
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def read_memory(pid):
+    # (RSS, PSS) tính bằng byte, từ /proc/<pid>/smaps_rollup (Linux)
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1]) * 1024
+    return values["Rss"], values["Pss"]
+
+
+def child_pids(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Trường thứ 4 là ppid; tên process (trường 2) có thể chứa khoảng trắng nên tách sau dấu ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def worker_pids(master_pid, n_workers):
+    # Với workers=1 uvicorn phục vụ ngay trong process chính; với N worker, các worker là process con
+    # (bỏ qua process resource_tracker của multiprocessing)
+    if n_workers == 1:
+        return [master_pid]
+    pids = []
+    for pid in child_pids(master_pid):
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            if b"resource_tracker" not in f.read():
+                pids.append(pid)
+    return pids
+
+
+def wait_ready(base_url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/docs", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+
+def make_request(app, batch_rows):
+    # Trả về hàm gửi một request bằng session đã cho
+    X, _ = synthetic.generate(batch_rows, seed=1)
+    if app == "app":
+        body = X.to_numpy(dtype="<f8").tobytes()
+        headers = {"content-type": "application/octet-stream"}
+        return lambda session, base_url: session.post(f"{base_url}/predict_batch_columnar",
+                                                      data=body, headers=headers).raise_for_status()
+    row = X.iloc[0].to_dict()
+    return lambda session, base_url: session.post(f"{base_url}/predict", json=row).raise_for_status()
+
+
+def load_test(base_url, send, clients, duration):
+    counts = [0] * clients
+    stop = time.time() + duration
+
+    def run(i):
+        session = requests.Session()
+        while time.time() < stop:
+            send(session, base_url)
+            counts[i] += 1
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts), time.perf_counter() - start
+
+
+def run_mode(app, mode, n_workers, args, port):
+    env = dict(os.environ, PUMPKIN_CACHE_SIZE="0", TF_CPP_MIN_LOG_LEVEL="3")
+    if app == "mlp":
+        env["PUMPKIN_BACKEND"] = args.mlp_backend
+    cmd = [sys.executable, "serve.py", "--workers", str(n_workers), "--port", str(port), "--host", "127.0.0.1"]
+    if mode != "shared":
+        cmd.append("--no-share")
+    base_url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(cmd, cwd=APP_DIRS[app], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(base_url)
+        send = make_request(app, args.batch_rows if app == "app" else 1)
+        # Làm nóng: đủ request để mọi worker đã load model trước khi đo
+        load_test(base_url, send, clients=2 * n_workers, duration=2.0)
+        requests_done, elapsed = load_test(base_url, send, args.clients or 2 * n_workers, args.duration)
+        rows = requests_done * (args.batch_rows if app == "app" else 1)
+        memory = [read_memory(pid) for pid in worker_pids(proc.pid, n_workers)]
+        master_rss, master_pss = read_memory(proc.pid) if n_workers > 1 else (0, 0)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    return {
+        "app": app,
+        "mode": mode,
+        "workers": n_workers,
+        "requests_per_s": requests_done / elapsed,
+        "rows_per_s": rows / elapsed,
+        "worker_rss_mb": [round(rss / 2 ** 20, 1) for rss, _ in memory],
+        "worker_pss_mb": [round(pss / 2 ** 20, 1) for _, pss in memory],
+        "total_pss_mb": round((sum(pss for _, pss in memory) + master_pss) / 2 ** 20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-worker memory and aggregate throughput of the serving modes")
+    parser.add_argument("--apps", nargs="+", choices=list(APP_DIRS), default=list(APP_DIRS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--clients", type=int, default=None, help="Số client đồng thời (mặc định 2 x workers)")
+    parser.add_argument("--batch-rows", type=int, default=1000, help="Số hàng mỗi request /predict_batch_columnar")
+    parser.add_argument("--mlp-backend", default="keras", choices=["keras", "numpy"],
+                        help="Backend của chế độ single / private (chế độ shared luôn dùng numpy)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "workers.json"))
+    args = parser.parse_args()
+
+    results = []
+    for app in args.apps:
+        for mode, n_workers in (("single", 1), ("private", args.workers), ("shared", args.workers)):
+            result = run_mode(app, mode, n_workers, args, args.port)
+            results.append(result)
+            print(f"{app:4s} {mode:8s} x{n_workers}: {result['rows_per_s']:12.0f} rows/s  "
+                  f"worker RSS {result['worker_rss_mb']} MB  worker PSS {result['worker_pss_mb']} MB  "
+                  f"total PSS {result['total_pss_mb']} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"cpu_count": os.cpu_count(), "args": vars(args), "results": results}, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import warnings
+
+import numpy as np
+
+import synthetic
+
+# Bộ đo hiệu năng: transformer, predict của các pipeline/model và các endpoint FastAPI (client in-process).
+# Kết quả ghi ra JSON; nếu có baseline thì so sánh và báo các phép đo chậm hơn ngưỡng cho phép.
+#
+#   python run_benchmarks.py                                   # kích thước mặc định
+#   python run_benchmarks.py --sizes 1 1000 1000000 10000000   # tới 10M hàng
+#   python run_benchmarks.py --baseline results/baseline.json  # so sánh, exit code 1 nếu có regression
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "App_using_ML")
+MLP_DIR = os.path.join(ROOT, "Classification with MLP")
+TRAIN_DIR = os.path.join(ROOT, "Pipeline_train")
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+DEFAULT_SIZES = [1, 100, 10_000, 1_000_000]
+
+# Giới hạn số hàng cho các phép đo tốn kém (SVC fit O(n^2), JSON theo hàng, request đơn lẻ)
+MAX_SVM_FIT_ROWS = 10_000
+MAX_ENDPOINT_ROWS = 100_000
+MAX_SINGLE_REQUESTS = 2_000
+
+
+def timeit(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+class Recorder:
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = []
+
+    def run(self, name, rows, fn, repeat=None):
+        best, median = timeit(fn, repeat or self.repeat)
+        result = {
+            "name": name,
+            "rows": rows,
+            "best_s": best,
+            "median_s": median,
+            "rows_per_s": rows / best if best > 0 else None,
+        }
+        self.results.append(result)
+        print(f"{name:40s} {rows:>10d} rows  best {best * 1000:10.3f} ms  median {median * 1000:10.3f} ms")
+        return result
+
+
+@contextlib.contextmanager
+def app_context(app_dir):
+    # Các app load file model theo đường dẫn tương đối nên phải chạy trong thư mục của app
+    old_cwd = os.getcwd()
+    sys.path.insert(0, app_dir)
+    os.chdir(app_dir)
+    try:
+        yield
+    finally:
+        os.chdir(old_cwd)
+        sys.path.remove(app_dir)
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_transformers(rec, sizes):
+    with app_context(TRAIN_DIR):
+        from my_transformers import OutlierHandler, CorrelationDropper
+        for n in sizes:
+            X, _ = synthetic.generate(n, outlier_rate=0.01)
+            handler = OutlierHandler(columns=synthetic.COLUMNS[:6])
+            rec.run("OutlierHandler.fit", n, lambda: handler.fit(X))
+            rec.run("OutlierHandler.transform", n, lambda: handler.transform(X))
+            if n < 2:
+                continue  # corr() cần ít nhất 2 hàng
+            dropper = CorrelationDropper(threshold=0.95)
+            rec.run("CorrelationDropper.fit", n, lambda: dropper.fit(X))
+            rec.run("CorrelationDropper.transform", n, lambda: dropper.transform(X))
+
+
+def bench_training(rec, sizes):
+    with app_context(TRAIN_DIR):
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import Pipeline
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.svm import SVC
+        from my_transformers import OutlierHandler, CorrelationDropper
+
+        def make(clf):
+            return Pipeline([
+                ("outlier_remover", OutlierHandler(columns=synthetic.COLUMNS[:6])),
+                ("corr_dropper", CorrelationDropper(threshold=0.95)),
+                ("scaler", StandardScaler()),
+                ("clf", clf),
+            ])
+
+        for n in sizes:
+            if n < 100:
+                continue
+            X, y = synthetic.generate(n, outlier_rate=0.01)
+            rec.run("train LR pipeline.fit", n,
+                    lambda: make(LogisticRegression(class_weight="balanced", max_iter=1000)).fit(X, y), repeat=1)
+            if n <= MAX_SVM_FIT_ROWS:
+                rec.run("train SVM pipeline.fit", n,
+                        lambda: make(SVC(kernel="rbf", class_weight="balanced", probability=True)).fit(X, y),
+                        repeat=1)
+
+
+def bench_pipelines(rec, sizes):
+    import joblib
+    with app_context(APP_DIR):
+        from fast_pipeline import compile_pipeline
+        from prediction_cache import PredictionCache
+        artifacts = [("model_pipeline.pkl", "LR"), ("model_svm_pipeline.pkl", "SVM")]
+        # Bản xấp xỉ Nystroem chỉ có sau khi chạy train_SVM.py --approx và copy artifact sang App_using_ML
+        if os.path.exists("model_svm_approx_pipeline.pkl"):
+            artifacts.append(("model_svm_approx_pipeline.pkl", "SVM-approx"))
+        for artifact, label in artifacts:
+            pipeline = joblib.load(artifact)
+            compiled = compile_pipeline(pipeline, synthetic.COLUMNS)
+            for n in sizes:
+                X, _ = synthetic.generate(n, outlier_rate=0.01)
+                values = X.to_numpy()
+                rec.run(f"{label} pipeline.predict_proba", n, lambda: pipeline.predict_proba(X))
+                rec.run(f"{label} compiled.predict_with_proba", n, lambda: compiled.predict_with_proba(values))
+                # Cùng kế hoạch qua cache dự đoán (tắt trong các phép đo endpoint): cold = cache rỗng, warm = mọi hàng hit
+                cache = PredictionCache(max_entries=max(n, 1))
+                cached = lambda: cache.predict(values, label, lambda X_miss: compiled.predict_with_proba(X_miss)[1])
+                rec.run(f"{label} cached predict (cold)", n, lambda: (cache.clear(), cached()))
+                rec.run(f"{label} cached predict (warm)", n, cached)
+
+
+def bench_mlp(rec, sizes):
+    with app_context(MLP_DIR):
+        from numpy_mlp import NumpyMLP, WEIGHTS_PATH
+        numpy_model = NumpyMLP.load(WEIGHTS_PATH)
+        try:
+            import joblib
+            import tensorflow as tf
+            keras_model = tf.keras.models.load_model("pumpkin_model.keras")
+            scaler = joblib.load("scaler.joblib")
+            from bucketed_predictor import BucketedPredictor
+            bucketed = BucketedPredictor(keras_model, len(synthetic.COLUMNS))
+            bucketed.warmup()
+        except ImportError:
+            keras_model = None
+            print("tensorflow not installed: skipping Keras model benchmarks")
+        for n in sizes:
+            X, _ = synthetic.generate(n)
+            rec.run("MLP numpy.predict", n, lambda: numpy_model.predict(X.to_numpy()))
+            if keras_model is not None:
+                rec.run("MLP keras.predict", n,
+                        lambda: keras_model.predict(scaler.transform(X), verbose=0, batch_size=4096))
+                rec.run("MLP bucketed.predict", n, lambda: bucketed.predict(scaler.transform(X)))
+
+
+def bench_app_endpoints(rec, sizes):
+    from fastapi.testclient import TestClient
+    with app_context(APP_DIR):
+        main = load_module("app_ml_main", os.path.join(APP_DIR, "main.py"))
+        client = TestClient(main.app)
+        for n in sizes:
+            if n > MAX_ENDPOINT_ROWS:
+                continue
+            X, _ = synthetic.generate(n, outlier_rate=0.01)
+            rows = X.to_dict(orient="records")
+            columns = X.to_dict(orient="list")
+            raw = X.to_numpy(dtype="<f8").tobytes()
+            rec.run("POST /predict_batch", n, lambda: client.post("/predict_batch", json=rows).raise_for_status())
+            rec.run("POST /predict_batch_columnar (json)", n,
+                    lambda: client.post("/predict_batch_columnar", json=columns).raise_for_status())
+            rec.run("POST /predict_batch_columnar (binary)", n,
+                    lambda: client.post("/predict_batch_columnar", content=raw,
+                                        headers={"content-type": "application/octet-stream"}).raise_for_status())
+
+
+def bench_mlp_endpoints(rec, sizes):
+    import httpx
+    from fastapi.testclient import TestClient
+    with app_context(MLP_DIR):
+        main = load_module("mlp_main", os.path.join(MLP_DIR, "main.py"))
+        client = TestClient(main.app)
+
+        async def concurrent_predict(rows):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as ac:
+                responses = await asyncio.gather(*[ac.post("/predict", json=row) for row in rows])
+            for response in responses:
+                response.raise_for_status()
+
+        for n in sizes:
+            X, _ = synthetic.generate(n)
+            if n <= MAX_SINGLE_REQUESTS:
+                rows = X.to_dict(orient="records")
+                rec.run("POST /predict (concurrent)", n, lambda: asyncio.run(concurrent_predict(rows)))
+            if n <= MAX_ENDPOINT_ROWS * 10:
+                csv = X.to_csv(index=False).encode()
+                files = {"file": ("bench.csv", csv, "text/csv")}
+                rec.run("POST /predict_file", n, lambda: client.post("/predict_file", files=files).raise_for_status())
+                rec.run("POST /predict_file?stream=true", n,
+                        lambda: client.post("/predict_file?stream=true", files=files).raise_for_status())
+
+
+def compare(results, baseline, tolerance):
+    # Regression: best_s lớn hơn baseline quá (1 + tolerance) lần, so khớp theo (name, rows)
+    base = {(r["name"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        b = base.get((r["name"], r["rows"]))
+        if b is None:
+            continue
+        ratio = r["best_s"] / b["best_s"] if b["best_s"] > 0 else 1.0
+        r["baseline_best_s"] = b["best_s"]
+        r["ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pumpkin seed benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+",
+                        choices=["transformers", "training", "pipelines", "mlp", "app", "mlp_app"],
+                        default=["transformers", "training", "pipelines", "mlp", "app", "mlp_app"])
+    parser.add_argument("--out", default=os.path.join(RESULTS_DIR, "latest.json"))
+    parser.add_argument("--baseline", default=None, help="JSON từ một lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Chậm hơn baseline bao nhiêu thì tính là regression")
+    parser.add_argument("--mlp-backend", default=os.environ.get("PUMPKIN_BACKEND", "numpy"), choices=["numpy", "keras"])
+    args = parser.parse_args()
+
+    # Đo đường tính toán thật của model: tắt cache dự đoán của các service
+    os.environ["PUMPKIN_CACHE_SIZE"] = "0"
+    os.environ["PUMPKIN_BACKEND"] = args.mlp_backend
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+    warnings.filterwarnings("ignore")
+
+    rec = Recorder(args.repeat)
+    sizes = sorted(args.sizes)
+    steps = {
+        "transformers": bench_transformers,
+        "training": bench_training,
+        "pipelines": bench_pipelines,
+        "mlp": bench_mlp,
+        "app": bench_app_endpoints,
+        "mlp_app": bench_mlp_endpoints,
+    }
+    for name in args.only:
+        print(f"--- {name}")
+        steps[name](rec, sizes)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "sizes": sizes,
+            "repeat": args.repeat,
+            "mlp_backend": args.mlp_backend,
+        },
+        "results": rec.results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(rec.results, json.load(f), args.tolerance)
+        report["regressions"] = [(r["name"], r["rows"], round(r["ratio"], 3)) for r in regressions]
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) vs baseline (tolerance {args.tolerance:.0%}):")
+        for r in regressions:
+            print(f"  {r['name']} @ {r['rows']} rows: {r['ratio']:.2f}x slower")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Sinh dữ liệu hạt bí giả lập theo đúng schema 12 cột của SeedData.
+# Các đại lượng đo trực tiếp (trục, diện tích, chu vi...) được sinh ngẫu nhiên trong khoảng của
+# Pumpkin_Seeds_Dataset; các đặc trưng phụ thuộc được tính theo công thức nên giữ đúng tương quan.
+
+COLUMNS = [
+    "Area", "Perimeter", "Major_Axis_Length", "Minor_Axis_Length",
+    "Convex_Area", "Equiv_Diameter", "Eccentricity", "Solidity",
+    "Extent", "Roundness", "Aspect_Ration", "Compactness",
+]
+
+CLASSES = np.array(["Çerçevelik", "Ürgüp Sivrisi"], dtype=object)
+
+# Khoảng giá trị (min, max) quan sát được trong bộ dữ liệu gốc
+RANGES = {
+    "Area": (47939, 136574),
+    "Perimeter": (868.485, 1559.45),
+    "Major_Axis_Length": (320.8446, 661.9113),
+    "Minor_Axis_Length": (152.1718, 305.818),
+    "Convex_Area": (48366, 138384),
+    "Equiv_Diameter": (247.0584, 417.0029),
+    "Eccentricity": (0.4921, 0.9481),
+    "Solidity": (0.9186, 0.9944),
+    "Extent": (0.468, 0.8296),
+    "Roundness": (0.5546, 0.9396),
+    "Aspect_Ration": (1.1487, 3.1444),
+    "Compactness": (0.5608, 0.9049),
+}
+
+
+def generate(n_rows, seed=0, outlier_rate=0.0):
+    # Trả về (X, y): DataFrame 12 cột theo thứ tự COLUMNS và Series nhãn dạng chuỗi
+    rng = np.random.default_rng(seed)
+    label = rng.random(n_rows) < 0.48
+
+    # Hạt Ürgüp Sivrisi dài hơn (tỉ lệ trục lớn hơn) so với Çerçevelik
+    aspect = np.where(label, rng.normal(2.35, 0.3, n_rows), rng.normal(1.8, 0.2, n_rows))
+    aspect = np.clip(aspect, *RANGES["Aspect_Ration"])
+    minor = np.clip(rng.normal(225, 22, n_rows), *RANGES["Minor_Axis_Length"])
+    major = np.clip(minor * aspect, *RANGES["Major_Axis_Length"])
+    minor = major / aspect
+
+    area = np.pi / 4 * major * minor * rng.uniform(0.97, 1.01, n_rows)
+    solidity = rng.uniform(0.975, 0.993, n_rows)
+    convex_area = area / solidity
+    # Chu vi ellipse (xấp xỉ Ramanujan) nhân hệ số gồ ghề của đường viền
+    a, b = major / 2, minor / 2
+    h = ((a - b) / (a + b)) ** 2
+    perimeter = np.pi * (a + b) * (1 + 3 * h / (10 + np.sqrt(4 - 3 * h))) * rng.uniform(1.0, 1.06, n_rows)
+
+    equiv_diameter = np.sqrt(4 * area / np.pi)
+    X = pd.DataFrame({
+        "Area": np.round(area),
+        "Perimeter": perimeter,
+        "Major_Axis_Length": major,
+        "Minor_Axis_Length": minor,
+        "Convex_Area": np.round(convex_area),
+        "Equiv_Diameter": equiv_diameter,
+        "Eccentricity": np.sqrt(1 - (minor / major) ** 2),
+        "Solidity": solidity,
+        "Extent": rng.uniform(0.6, 0.8, n_rows),
+        "Roundness": 4 * np.pi * area / perimeter ** 2,
+        "Aspect_Ration": aspect,
+        "Compactness": equiv_diameter / major,
+    })[COLUMNS].round(4)
+
+    if outlier_rate > 0:
+        # Thêm outlier vào các cột kích thước để OutlierHandler có việc để làm
+        for col in COLUMNS[:6]:
+            mask = rng.random(n_rows) < outlier_rate
+            X.loc[mask, col] = X.loc[mask, col] * rng.choice([0.3, 3.0], mask.sum())
+
+    y = pd.Series(CLASSES[label.astype(int)], name="Class")
+    return X, y
+
+
+def iter_chunks(n_rows, chunk_rows=1_000_000, seed=0, outlier_rate=0.0):
+    # Sinh dữ liệu lớn (ví dụ 10M hàng) theo từng chunk để không phải giữ tất cả trong RAM
+    for i, start in enumerate(range(0, n_rows, chunk_rows)):
+        yield generate(min(chunk_rows, n_rows - start), seed=seed + i, outlier_rate=outlier_rate)